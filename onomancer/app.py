@@ -1,5 +1,4 @@
 import base64
-import datetime
 import functools
 import json
 import logging
@@ -8,27 +7,29 @@ import math
 import secrets
 import urllib.parse
 import uuid
+import zlib
 
 from flask import (
     Flask,
+    Response,
     make_response,
     render_template,
     request,
     jsonify,
     session,
     redirect,
+    stream_with_context,
     url_for,
 )
 from flask_simple_csrf import CSRF
-from profanity import profanity
 from flask_limiter import Limiter
 from flask_limiter.util import get_ipaddr
 from flask_minify import minify
 from flask_cors import CORS
 from pylru import lrucache
-from blaseball_mike.models import Player
 
-from onomancer import database
+from onomancer import database, players
+from onomancer.names import process_name
 from onomancer.stash import Stash
 
 logging.basicConfig(level=logging.WARN)
@@ -79,8 +80,6 @@ class HttpsProxy(object):
 app.wsgi_app = HttpsProxy(app.wsgi_app)
 
 
-profanity.load_words()
-
 nonsense = lrucache(10000)
 
 
@@ -168,7 +167,7 @@ def vote(message='', guid=None, stashed=None):
             message = 'The page turns...'
         names = name.split(' ')
         try:
-            names = [_process_name(n) for n in names]
+            names = [process_name(n) for n in names]
         except ValueError:
             name = database.get_random_name()
             message = 'Naughty...'
@@ -213,22 +212,22 @@ def annotate():
         message = 'A note taken. '
         judgement = ord(request.form['judgement'])
         if judgement == 128072:  # left
-            database.annotate_egg(name, first=2)
+            database.apply_judgement(name, 'left')
             message += 'The ink shifts left...'
             stashed.increment_stat('👈')
         elif judgement == 128073:  # right
-            database.annotate_egg(name, second=2)
+            database.apply_judgement(name, 'right')
             message += 'The ink shifts right...'
             stashed.increment_stat('👉')
         elif judgement == 128588:
-            database.annotate_egg(name, both=True)
+            database.apply_judgement(name, 'both')
             message += random.choice([
                 'The ink swirls...',
                 'The ink settles...',
             ])
             stashed.increment_stat('🙌')
         elif judgement == 128078:
-            database.upvote_name(name, thumbs=-1)
+            database.apply_judgement(name, 'fade')
             message += 'The ink fades...'
             stashed.increment_stat('👎👎')
         elif judgement == 129335:
@@ -245,7 +244,7 @@ def annotate():
         if rotkey:
             name = super_safe_decrypt(name, session['USER_CSRF'] + rotkey)
         try:
-            name = _process_name(name)
+            name = process_name(name)
         except ValueError:
             name = database.get_eggs(limit=1, rand=1)[0]
             message = 'Naughty...'
@@ -298,10 +297,10 @@ def downLeader():
     rotkey = session['rotkey']
     name = super_safe_decrypt(urllib.parse.unquote(request.form.get('name')), session['PREV_NONCE'] + rotkey)
     if command == 'flip':
-        database.flip_leader(name)
+        database.apply_judgement(name, 'flip')
         message = "The pages thrum with feedback..."
     elif command == 'down':
-        database.upvote_name(name, thumbs=-1, hit_eggs=False)
+        database.apply_judgement(name, 'sink')
         message = "A judgement made, the Chosen shift..."
     else:
         message = "Hmm?"
@@ -322,10 +321,10 @@ def submit():
     try:
         if request.form.get('name'):
             # egg
-            name = _process_name(request.form.get('name'))
+            name = process_name(request.form.get('name'))
             database.add_name(name)
         elif request.form.get('fullname'):
-            name = _process_name(request.form.get('fullname'))
+            name = process_name(request.form.get('fullname'))
             names = name.split(' ', 1)
             if len(names) == 1:
                 # maybe accidental one name submission
@@ -353,21 +352,6 @@ def pool():
     return res
 
 
-def _process_name(name):
-    if not name:
-        raise ValueError()
-    if len(name) > 25:
-        raise ValueError()
-    profane = profanity.contains_profanity(name)
-    if profane:
-        raise ValueError()
-    name = name.strip()
-    if name.lower() == name:
-        # no capital letters, make some assumptions
-        return name.title()
-    return name
-
-
 @app.route('/rate', methods=['POST'])
 @require_csrf
 def rate():
@@ -382,36 +366,19 @@ def rate():
     message = f'Your judgement is rendered.'
     stashed = Stash()
     if judgement == 128077:  # upvote
-        database.upvote_name(name, thumbs=1)
-        if request.form['reverse']:
-            try:
-                eggs = name.split(' ', 1)
-                database.annotate_egg(eggs[0], first=1)
-                database.annotate_egg(eggs[-1], second=1)
-            except KeyError:
-                pass
+        database.apply_judgement(name, 'up', reverse=bool(request.form['reverse']))
         message += ' The Onomancer nods...'
         stashed.increment_stat('👍')
     elif judgement == 128154:  # love
-        database.upvote_name(name, thumbs=2)
-        try:
-            eggs = name.split(' ', 1)
-            database.annotate_egg(eggs[0], first=1)
-            database.annotate_egg(eggs[-1], second=1)
-        except KeyError:
-            pass
+        database.apply_judgement(name, 'love')
         message += ' The Onomancer smiles...'
         stashed.increment_stat('💚')
     elif judgement == 128148:  # hate
-        database.upvote_name(name, thumbs=-2)
-        flipped = ' '.join(name.split(' ')[::-1])
-        database.upvote_name(flipped, thumbs=-2, hit_eggs=False)
+        database.apply_judgement(name, 'hate')
         message += ' The Onomancer frowns...'
         stashed.increment_stat('💔')
     elif judgement == 128078:  # thumbs down
-        flipped = ' '.join(name.split(' ')[::-1])
-        database.upvote_name(flipped, thumbs=-1, hit_eggs=False)
-        database.upvote_name(name, thumbs=-1)
+        database.apply_judgement(name, 'down')
         message += ' The Onomancer stares...'
         stashed.increment_stat('👎')
 
@@ -426,15 +393,22 @@ def rate():
 def moderate(key, type_=''):
     if app.config['MOD_KEY'] != key:
         return redirect(url_for('what'))
+    message = None
     if request.method == 'POST':
-        mod_action = {
-            id_: 0 if val == 'good' else -1
-            for id_, val in request.form.items()
-        }
-        if type_ == 'names':
-            database.moderate(names=mod_action)
-        if type_ == 'eggs':
-            database.moderate(eggs=mod_action)
+        # fields are `table:id` for the whole queue, or bare ids for one table;
+        # anything left on skip isn't touched
+        tables = {'names': 'leaders', 'eggs': 'names'}
+        actions = []
+        for field, val in request.form.items():
+            if field == 'simplecsrf' or val not in ('good', 'bad'):
+                continue
+            tbl, _, id_ = field.rpartition(':')
+            actions.append((tbl or tables.get(type_), id_, val))
+        results = database.moderate_bulk(actions)
+        failed = [r for r in results if not r['ok']]
+        message = f'{len(results) - len(failed)} moderated'
+        if failed:
+            message += ', failed: ' + ', '.join(f'{r["table"]} {r["id"]} ({r["error"]})' for r in failed)
 
     mod_list = database.get_mod_list()
     return make_response(render_template(
@@ -442,9 +416,29 @@ def moderate(key, type_=''):
         leaders=mod_list['names'],
         eggs=mod_list['eggs'],
         key=key,
+        message=message,
     ))
 
 
+@app.route('/moderate/bulk/<key>', methods=['POST'])
+def moderate_bulk(key):
+    """
+    json body `{"actions": [[table, id, action], ...]}`, table leaders or
+    names, action good, bad, pending, reset or delete
+    """
+    if app.config['MOD_KEY'] != key:
+        return redirect(url_for('what'))
+    body = request.get_json(silent=True) or {}
+    actions = body.get('actions')
+    if not isinstance(actions, list) or not all(
+        isinstance(a, list) and len(a) == 3 and
+        isinstance(a[0], str) and isinstance(a[1], (str, int)) and not isinstance(a[1], bool) and isinstance(a[2], str)
+        for a in actions
+    ):
+        return jsonify({'error': '`actions` must be a list of [table, id, action]'}), 400
+    return jsonify({'results': database.moderate_bulk([tuple(a) for a in actions])})
+
+
 @app.route('/moderate/bad-eggs/<key>', methods=['GET'])
 def get_bad_eggs(key):
     if app.config['MOD_KEY'] != key:
@@ -588,7 +582,7 @@ def collect():
             if request.form.get('cname'):
                 try:
                     cname = ' '.join([
-                        _process_name(n) for n in request.form['cname'].split(' ')
+                        process_name(n) for n in request.form['cname'].split(' ')
                     ])
                 except ValueError:
                     cname = 'Collection'
@@ -741,13 +735,12 @@ def _load_collection(friends, anim=None, lineup_length=9):
 
 def _parse_collection_names(names, anim=None, lineup_length=9):
     collection = []
+    stats = players.get_stats(names)
     for i, name in enumerate(names):
-        player = Player.make_random(seed=name)
-        player = player.simulated_copy(buffs={'overall_rating': (player.total_fingers - 10) * .01})
         if i < lineup_length:
-            rating = player.batting_stars
+            rating = stats[name]['batting_stars']
         else:
-            rating = player.pitching_stars
+            rating = stats[name]['pitching_stars']
         rating = math.modf(rating)
         collection.append((
             name,
@@ -802,12 +795,60 @@ def _uncurse_collection(code):
     return database.get_names_from_ids(ids)
 
 
+def _stream_dump(dump):
+    """
+    Stream rows out as a json array, or one object per line with
+    `?format=ndjson`, gzipped on the way if the client accepts it.
+    `?since_id=` picks up after the last id a previous dump got to.
+    """
+    try:
+        since_id = int(request.args.get('since_id', 0))
+    except ValueError:
+        return jsonify({'error': '`since_id` must be an integer'}), 400
+    ndjson = request.args.get('format') == 'ndjson'
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+
+    def chunks():
+        if not ndjson:
+            yield '['
+        for i, row in enumerate(dump(since_id)):
+            if ndjson:
+                yield json.dumps(row) + '\n'
+            else:
+                yield (',' if i else '') + json.dumps(row)
+        if not ndjson:
+            yield ']'
+
+    def encoded():
+        gz = zlib.compressobj(wbits=31) if compress else None
+        buf = []
+        size = 0
+        for chunk in chunks():
+            buf.append(chunk)
+            size += len(chunk)
+            if size >= 64 * 1024:
+                data = ''.join(buf).encode()
+                buf, size = [], 0
+                yield gz.compress(data) if gz else data
+        data = ''.join(buf).encode()
+        yield gz.compress(data) + gz.flush() if gz else data
+
+    res = Response(
+        stream_with_context(encoded()),
+        mimetype='application/x-ndjson' if ndjson else 'application/json',
+    )
+    if compress:
+        res.headers['Content-Encoding'] = 'gzip'
+    res.headers['Vary'] = 'Accept-Encoding'
+    return res
+
+
 @app.route('/moderate/dumpEggs/<key>')
 @limiter.limit('1/minute')
 def mod_dump_eggs(key):
     if app.config['MOD_KEY'] != key:
         return redirect(url_for('what'))
-    return jsonify(database.dump_names())
+    return _stream_dump(database.dump_names)
 
 
 @app.route('/moderate/dumpNames/<key>')
@@ -815,7 +856,7 @@ def mod_dump_eggs(key):
 def mod_dump_names(key):
     if app.config['MOD_KEY'] != key:
         return redirect(url_for('what'))
-    return jsonify(database.dump_leaders())
+    return _stream_dump(database.dump_leaders)
 
 
 @app.route('/chart/names')
@@ -845,12 +886,26 @@ def chart_annotations():
     ))
 
 
+def _chart_range():
+    """start, end and points query params of the egg charts"""
+    try:
+        start = int(request.args.get('start', 1))
+        end = request.args.get('end')
+        end = int(end) if end else None
+        points = int(request.args.get('points', database.CHART_POINTS))
+    except ValueError:
+        raise ValueError('`start`, `end` and `points` must be integers')
+    return start, end, max(3, min(points, 5000))
+
+
 @app.route('/chart/eggs')
 @limiter.limit('1/second')
 def chart_eggs():
-    start = request.args.get('start', 1)
-    end = request.args.get('end', None)
-    good, bad = database.chart_eggs(start=start, end=end)
+    try:
+        start, end, points = _chart_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    good, bad = database.chart_eggs(start=start, end=end, budget=points)
     return make_response(render_template(
         'egg_chart.html',
         good_eggs=good,
@@ -860,10 +915,9 @@ def chart_eggs():
 
 @app.route('/vibeGraph/<name>')
 def chart_vibes(name):
-    player = Player.make_random(name=name, seed=name)
-    player = player.simulated_copy(buffs={'overall_rating': (player.total_fingers - 10) * .01})
+    stats = players.get_stats([name])[name]
     days = list(range(99))
-    vibes = [player.get_vibe(d) for d in days]
+    vibes = players.vibe_curve(stats, days)
     return make_response(render_template(
         'vibe_chart.html',
         days=days,
@@ -880,9 +934,11 @@ def chart_vibes(name):
 @app.route('/chart/eggVotes')
 @limiter.limit('1/second')
 def chart_egg_votes():
-    start = request.args.get('start', 1)
-    end = request.args.get('end', None)
-    votes = database.chart_egg_votes(start=start, end=end)
+    try:
+        start, end, points = _chart_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    votes = database.chart_egg_votes(start=start, end=end, budget=points)
     return make_response(render_template(
         'egg_vote_chart.html',
         eggs=votes,
@@ -890,13 +946,25 @@ def chart_egg_votes():
     ))
 
 
+@app.route('/api/eggPercentiles')
+@limiter.limit('5/second')
+def egg_percentiles():
+    try:
+        ps = [float(p) for p in request.args.get('p', '10,25,50,75,90').split(',')]
+    except ValueError:
+        return jsonify({'error': '`p` must be a comma separated list of numbers'}), 400
+    if any(p < 0 or p > 100 for p in ps):
+        return jsonify({'error': '`p` must be between 0 and 100'}), 400
+    return jsonify({f'{p:g}': database.egg_score_percentile(p) for p in ps})
+
+
 @app.route('/api/getName')
 @limiter.limit('25/second')
 def get_name():
     name = database.get_random_name()
     with_stats = request.args.get('with_stats', False)
     if with_stats:
-        return _make_player_json(name)
+        return players.player_json(name)
     return jsonify(name)
 
 
@@ -909,7 +977,8 @@ def get_names():
         'offset',
         'random',
         'with_stats',
-    }
+        'cursor',
+    } | {f'min_{col}' for col in database.PLAYER_COLUMNS}
     for arg in request.args:
         if arg not in valid_args:
             return jsonify({'error': f'unrecognized query parameter `{arg}`'}), 400
@@ -917,11 +986,28 @@ def get_names():
     limit = int(request.args.get('limit', 100))
     offset = int(request.args.get('offset', 0))
     rand = request.args.get('random', 0)
-
-    names = database.get_names(threshold, limit, offset, rand)
     with_stats = request.args.get('with_stats', False)
+    mins = {}
+    for col in database.PLAYER_COLUMNS:
+        if f'min_{col}' in request.args:
+            try:
+                mins[col] = float(request.args[f'min_{col}'])
+            except ValueError:
+                return jsonify({'error': f'`min_{col}` must be a number'}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            page = database.get_names_page(threshold, limit, cursor, mins=mins)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if with_stats:
+            page['data'] = players.players_json(page['data'])
+        return jsonify(page)
+
+    names = database.get_names(threshold, limit, offset, rand, mins=mins)
     if with_stats:
-        return jsonify([_make_player_json(name) for name in names])
+        return jsonify(players.players_json(names))
 
     return jsonify(names)
 
@@ -937,6 +1023,7 @@ def get_eggs():
         'first',
         'second',
         'affinity',
+        'cursor',
     }
     for arg in request.args:
         if arg not in valid_args:
@@ -948,13 +1035,19 @@ def get_eggs():
     first = request.args.get('first', float('-inf'))
     second = request.args.get('second', float('-inf'))
     affinity = float(request.args.get('affinity', 0))
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            return jsonify(database.get_eggs_page(threshold, limit, cursor, first=first, second=second, affinity=affinity))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     return jsonify(database.get_eggs(threshold, limit, offset, rand, first=first, second=second, affinity=affinity))
 
 
 @app.route('/api/generateStats/<name>')
 @limiter.limit('50/second')
 def generateStats(name):
-    return jsonify(_make_player_json(name))
+    return jsonify(players.player_json(name))
 
 
 @app.route('/api/getOrGenerateStats')
@@ -965,7 +1058,7 @@ def getOrGenerateStats():
         return jsonify({'error': 'missing required param `name`'}), 400
     if len(name) > 240:
         return jsonify({'error': 'name exceeds 240 characters'}), 400
-    return jsonify(_get_or_generate_player(name))
+    return jsonify(players.player_json(name))
 
 
 @app.route('/api/crawlNames/<name>')
@@ -988,18 +1081,11 @@ def crawlEggs():
     return jsonify(database.crawl_eggs(likenesses, threshold, fanout, limit, egg_threshold))
 
 
-@functools.lru_cache(512)
-def _get_or_generate_player(name):
-    # we don't need this anymore lmao
-    player = _make_player_json(name)
-    return player
-
-
 @app.route('/api/generateStats2')
 @limiter.limit('50/second')
 def generateStats2():
     name = request.args.get('name')
-    return jsonify(_make_player_json(name))
+    return jsonify(players.player_json(name))
 
 
 @app.route('/api/getStats')
@@ -1008,9 +1094,10 @@ def getStats():
     if not guids:
         return jsonify({'error': 'missing argument `ids`'}), 400
     names = database.get_names_from_guids(guids)
+    stats = players.get_stats(names.values())
     res = {}
     for guid, name in names.items():
-        res[guid] = _make_player_json(name, id_=guid)
+        res[guid] = players.with_vibe(stats[name], id_=guid)
     return jsonify(res)
 
 
@@ -1036,9 +1123,7 @@ def getCollection():
     team_name = qs.get('cname', ['North Pole Placeholders'])[0]
 
     names = _uncurse_collection(token)
-    collection = []
-    for name in names:
-        collection.append(_make_player_json(name))
+    collection = players.players_json(names)
     return {
         'fullName': team_name,
         'slogan': slogan,
@@ -1063,7 +1148,7 @@ def shareName(guid, message='The token shared...'):
     examine = 'examine' in request.args
     interview = None
 
-    player = _make_player_json(name)
+    player = players.player_json(name)
     stars = [
         ('Batting', range(int(player['batting_stars'])), math.modf(player['batting_stars'])[0]),
         ('Pitching', range(int(player['pitching_stars'])), math.modf(player['pitching_stars'])[0]),
@@ -1114,7 +1199,7 @@ def search():
     if name and len(name) <= 3:
         message = 'More letters needed'
     if name:
-        lookup = sorted(database.lookup(name, only_good=True, with_threshold=True)['names'], key=lambda n: n['name'])
+        lookup = database.lookup(name, only_good=True, with_threshold=True)['names']
         names = {n['guid']: n['name'] for n in lookup}
         if not names:
             message = 'A blank...'
@@ -1142,9 +1227,10 @@ def reflect():
                 'reflect.html',
                 message='Naughty...',
             ))
-        player = _get_or_generate_player(name)
+        current_vibe = None
         if request.args.get('vibe'):
-            player['current_vibe'] = float(request.args['vibe'])
+            current_vibe = float(request.args['vibe'])
+        player = players.player_json(name, current_vibe=current_vibe)
         if player['current_vibe'] < -0.8:
             vibe = ('Honestly Terrible', 'ff0000')
         elif player['current_vibe'] < -0.4:
@@ -1279,33 +1365,3 @@ def stash():
     ))
     stashed.save(res)
     return res
-
-
-def _make_player_json(name, id_=None):
-    player = Player.make_random(name=name, seed=name)
-    player = player.simulated_copy(buffs={'overall_rating': (player.total_fingers - 10) * .01})
-    js = player.json()
-    props = [
-        'soulscream',
-        'batting_rating',
-        'batting_stars',
-        'pitching_rating',
-        'pitching_stars',
-        'baserunning_rating',
-        'baserunning_stars',
-        'defense_rating',
-        'defense_stars',
-    ]
-    for prop in props:
-        js[prop] = getattr(player, prop)
-    if id_:
-        js['id'] = id_
-    js['current_vibe'] = player.get_vibe(_current_day())
-    return js
-
-
-def _current_day():
-    now = datetime.datetime.utcnow()
-    monday = now - datetime.timedelta(days=now.weekday())
-    return (now - monday.replace(hour=17)).total_seconds() / 3600
-
@@ -0,0 +1,222 @@
+"""
+EXPLAIN QUERY PLAN check for database.py. Builds a throwaway db with some
+eggs, names and votes in it, runs every query the app makes against it and
+fails on any full table scan, or walk of a whole index, that isn't in
+EXPECTED_SCANS, and on any exercise that raises.
+
+Only statements that actually run get checked, so branches that the seeded
+db wouldn't reach on their own (like the sample_rows fallback) are forced.
+
+    python -m onomancer.audit
+"""
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+
+from onomancer import database
+
+# (function in database.py, table) -> why reading the whole table is fine
+EXPECTED_SCANS = {
+    ('_load_egg_snapshot', 'names'): 'the egg snapshot holds every good egg',
+    ('_load_score_index', 'names'): 'the score index holds every good egg',
+    ('lookup', 'names'): 'under three letters there is no trigram to search, LIKE reads every egg',
+    ('lookup', 'leaders'): 'under three letters there is no trigram to search, LIKE reads every name',
+    ('purge', 'leaders'): 'same as lookup for purges shorter than a trigram, a moderator-only action',
+}
+
+# with or without USING INDEX, either way every row gets read
+_SCAN = re.compile(r'^SCAN (\w+)')
+# a virtual table scan with a constraint (an fts MATCH) is a search of its index
+_VTAB_SEARCH = re.compile(r'VIRTUAL TABLE INDEX \d+:\S')
+_AUDITED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+# traced sql has its parameters filled in, and sqlite writes infinity as Inf
+_INF = re.compile(r'\bInf\b')
+
+
+def _seed(eggs=2000, names=10000):
+    """Eggs and names in through the importer, then votes and moderation spread over them"""
+    rng = random.Random(1)
+    egg_names = [f'Egg{i}' for i in range(eggs)]
+    rows = [{'name': e, 'kind': 'egg'} for e in egg_names]
+    rows += [{'name': f'{rng.choice(egg_names)} {rng.choice(egg_names)}', 'kind': 'name'} for _ in range(names)]
+    database.import_rows(rows)
+    with database.write() as conn:
+        conn.execute(
+            '''
+            UPDATE names SET
+                upvotes = abs(random() % 30),
+                downvotes = -abs(random() % 7),
+                first_votes = abs(random() % 10),
+                second_votes = abs(random() % 10),
+                naughty = CASE abs(random() % 8) WHEN 0 THEN 1 WHEN 1 THEN -1 ELSE 0 END
+            '''
+        )
+        conn.execute(
+            '''
+            UPDATE leaders SET
+                votes = abs(random() % 45) - 6,
+                naughty = CASE abs(random() % 8) WHEN 0 THEN 1 WHEN 1 THEN -1 ELSE 0 END
+            '''
+        )
+    for name in database.get_names(limit=300, rand=1):
+        database.upvote_name(name)
+
+
+def _fallback(call):
+    """`call` with sample_rows going straight to its ORDER BY RANDOM() fallback"""
+    def run():
+        rounds, database.SAMPLE_ROUNDS = database.SAMPLE_ROUNDS, 0
+        try:
+            return call()
+        finally:
+            database.SAMPLE_ROUNDS = rounds
+    return run
+
+
+def _exercise():
+    """(label, call) for every public query, run in this order"""
+    leader = database.get_names(limit=1)[0]
+    leaders = database.get_names(limit=5, offset=10)
+    egg = leader.split(' ', 1)[0]
+    with database.connect() as conn:
+        ids = [r['id'] for r in conn.execute('SELECT id FROM leaders ORDER BY id LIMIT 5')]
+        guids = [r['guid'] for r in conn.execute('SELECT guid FROM leaders WHERE naughty = 0 ORDER BY id LIMIT 5')]
+        egg_id = conn.execute('SELECT id FROM names WHERE name = ?', (egg,)).fetchone()['id']
+    page = database.get_names_page(limit=5)['next']
+    egg_page = database.get_eggs_page(limit=5)['next']
+    return [
+        ('add_name', lambda: database.add_name('Auditegg')),
+        ('upvote_name', lambda: database.upvote_name(leader)),
+        ('upvote_name new', lambda: database.upvote_name('Auditegg Egg1')),
+        ('flip_leader', lambda: database.flip_leader(leader)),
+        ('get_leaders', lambda: database.get_leaders()),
+        ('get_leaders past the board', lambda: database.get_leaders(top=database.TOP_K + 1)),
+        ('get_weekly', lambda: database.get_weekly()),
+        ('compact_weekly', database.compact_weekly),
+        ('get_random_name', lambda: [database.get_random_name() for _ in range(50)]),
+        ('egg_score_percentile', lambda: database.egg_score_percentile(50)),
+        ('get_mod_list', database.get_mod_list),
+        ('moderate_bulk', lambda: database.moderate_bulk([('leaders', ids[0], 'good'), ('names', egg_id, 'reset')])),
+        ('lookup', lambda: database.lookup('Egg12', only_good=True, with_threshold=True)),
+        ('lookup short', lambda: database.lookup('g1')),
+        ('mark_naughty', lambda: database.mark_naughty(ids[1], naughty=0)),
+        ('reset_egg', lambda: database.reset_egg(egg_id)),
+        ('reset_leader', lambda: database.reset_leader(ids[1])),
+        ('admin_leaders', database.admin_leaders),
+        ('admin_eggs', database.admin_eggs),
+        ('random_pool', lambda: database.random_pool(20)),
+        ('flag_name', lambda: database.flag_name('Auditegg Flagged', 'audit')),
+        ('flag_egg', lambda: database.flag_egg(egg, 'audit')),
+        ('collect', database.collect),
+        ('get_collection_ids', lambda: database.get_collection_ids(leaders)),
+        ('get_names_from_ids', lambda: database.get_names_from_ids(ids)),
+        ('get_names_from_guids', lambda: database.get_names_from_guids(guids)),
+        ('get_guid_for_name', lambda: database.get_guid_for_name(leader)),
+        ('get_name_from_guid', lambda: database.get_name_from_guid(guids[0])),
+        ('share_guid', lambda: database.share_guid(leader)),
+        ('share_guid new', lambda: database.share_guid('Egg1 Egg2 Egg3')),
+        ('dump_names', lambda: list(database.dump_names(since_id=ids[-1]))),
+        ('dump_leaders', lambda: list(database.dump_leaders(since_id=ids[-1]))),
+        ('chart_leaders', database.chart_leaders),
+        ('chart_eggs', lambda: database.chart_eggs(budget=100)),
+        ('chart_egg_votes', lambda: database.chart_egg_votes(budget=100)),
+        ('chart_annotations', database.chart_annotations),
+        ('get_names', lambda: database.get_names(threshold=1, limit=20, offset=20)),
+        ('get_names rand', lambda: database.get_names(threshold=1, limit=20, rand=1)),
+        ('get_names_page', lambda: database.get_names_page(threshold=1, limit=20, cursor=page)),
+        ('get_names by stars', lambda: database.get_names(limit=20, mins={'pitching_stars': 4.5, 'batting_stars': 2})),
+        ('get_names_page by stars', lambda: database.get_names_page(limit=20, mins={'soulscream_length': 100})),
+        ('crawl_names', lambda: database.crawl_names(leader)),
+        ('crawl_eggs', lambda: database.crawl_eggs([egg])),
+        ('get_eggs', lambda: database.get_eggs(threshold=1, limit=20, offset=20)),
+        ('get_eggs rand', lambda: database.get_eggs(limit=20, rand=1, affinity=0.5)),
+        ('get_eggs_page', lambda: database.get_eggs_page(limit=20, cursor=egg_page, affinity=-0.5)),
+        ('annotate_egg', lambda: database.annotate_egg(egg, both=True)),
+        ('apply_judgement', lambda: [database.apply_judgement(leader, j) for j in database.JUDGEMENTS]),
+        ('get_annotate_examples', lambda: database.get_annotate_examples(egg)),
+        ('get_annotate_examples rand', lambda: database.get_annotate_examples(egg, rand=1)),
+        ('get_random_name fallback', _fallback(lambda: [database.get_random_name() for _ in range(50)])),
+        ('random_pool fallback', _fallback(lambda: database.random_pool(20))),
+        ('collect fallback', _fallback(database.collect)),
+        ('get_names rand fallback', _fallback(lambda: database.get_names(threshold=1, limit=20, rand=1))),
+        ('get_eggs rand fallback', _fallback(lambda: database.get_eggs(limit=20, rand=1, affinity=0.5))),
+        ('import_rows', lambda: database.import_rows([{'name': 'Auditegg Egg2'}, {'name': 'Egg3 Egg4'}])),
+        ('save_player_stats', lambda: database.save_player_stats({leader: {'name': leader}}, 0)),
+        ('get_player_stats', lambda: database.get_player_stats(leaders + [leader], 0)),
+        ('delete_leader', lambda: database.delete_leader(ids[2])),
+        ('delete_egg', lambda: database.delete_egg(egg_id)),
+        ('purge', lambda: database.purge('Auditegg')),
+        ('purge short', lambda: database.purge('zq')),
+    ]
+
+
+def _caller():
+    """The database.py function running the query being traced"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename == database.__file__:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def audit():
+    """
+    Unexpected full scans as (label, function, table, sql), and exercises that
+    raised as (label, exception); both empty if everything is fine
+    """
+    tmp = tempfile.mkdtemp()
+    database.DB_NAME = os.path.join(tmp, 'audit.db')
+    database.bootstrap()
+    _seed()
+    statements = []
+    errors = []
+    calls = _exercise()
+    conn = database.connect()
+    label = None
+
+    def trace(sql):
+        if sql.lstrip().upper().startswith(_AUDITED):
+            statements.append((label, _caller(), sql))
+
+    conn.set_trace_callback(trace)
+    try:
+        for label, call in calls:
+            try:
+                call()
+            except Exception as e:
+                # the rest of that code path never ran, so its queries weren't checked
+                errors.append((label, e))
+    finally:
+        conn.set_trace_callback(None)
+
+    explain = sqlite3.connect(database.DB_NAME)
+    tables = {r[0] for r in explain.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    found = []
+    seen = set()
+    for label, func, sql in statements:
+        if sql in seen:
+            continue
+        seen.add(sql)
+        for row in explain.execute(f'EXPLAIN QUERY PLAN {_INF.sub("1e999", sql)}'):
+            scan = _SCAN.match(row[3])
+            if scan and _VTAB_SEARCH.search(row[3]):
+                continue
+            if scan and scan.group(1) in tables and (func, scan.group(1)) not in EXPECTED_SCANS:
+                found.append((label, func, scan.group(1), sql))
+    explain.close()
+    return found, errors
+
+
+if __name__ == '__main__':
+    found, errors = audit()
+    for label, func, table, sql in found:
+        print(f'{label}: {func} scans {table}\n    {" ".join(sql.split())[:300]}')
+    for label, e in errors:
+        print(f'{label}: raised {e!r}')
+    print(f'{len(found)} unexpected scans, {len(errors)} errors')
+    if found or errors:
+        sys.exit(1)
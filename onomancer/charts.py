@@ -0,0 +1,39 @@
+"""
+Downsampling for the chart pages, so a chart of every egg stays a few
+hundred points. Nothing in here talks to the database.
+"""
+
+
+def lttb(xs, ys, budget):
+    """
+    Indices of at most `budget` points of the series (xs sorted) that keep
+    its shape, by largest-triangle-three-buckets. The first and last points
+    are always kept.
+    """
+    n = len(xs)
+    if budget >= n or n <= 2:
+        return list(range(n))
+    budget = max(budget, 3)
+    picked = [0]
+    # the points between the ends go into budget - 2 buckets
+    every = (n - 2) / (budget - 2)
+    a = 0
+    for i in range(budget - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # the average of the next bucket stands in for the third corner
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        if nlo >= n - 1:
+            nlo, nhi = n - 1, n
+        avg_x = sum(xs[nlo:nhi]) / (nhi - nlo)
+        avg_y = sum(ys[nlo:nhi]) / (nhi - nlo)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
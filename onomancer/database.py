@@ -1,10 +1,16 @@
 import base64
+import csv
 import datetime
 import functools
+import json
 import logging
+import math
+import os
 import random
 import sqlite3
 import sys
+import threading
+import time
 from urllib.parse import quote
 import uuid
 from collections import namedtuple
@@ -12,10 +18,51 @@ from contextlib import contextmanager
 
 from imagekitio import ImageKit
 
+from onomancer.charts import lttb
+from onomancer.eggs import EggSnapshot, ScoreIndex, is_bad_egg
+from onomancer.graph import EggGraph, split_name
+from onomancer.leaderboard import TOP_K, TopK, WeeklyBoard
+from onomancer.names import egg_name, process_name, split_full_name
+from onomancer.votebuffer import VoteBuffer, VoteDelta
+
 DB_NAME = 'data/onomancer.db'
 VOTE_THRESHOLD = -4
 LEADER_THRESHOLD = -2
 ANNOTATE_THRESHOLD = 1
+POOL_SIZE = int(os.environ.get('ONOMANCER_POOL_SIZE', 8))
+PRAGMAS = [
+    'journal_mode = WAL',
+    'synchronous = NORMAL',
+    'busy_timeout = 5000',
+    'cache_size = -16000',
+    'temp_store = MEMORY',
+]
+# how often an in-memory snapshot checks whether its tables moved on
+SNAPSHOT_INTERVAL = float(os.environ.get('ONOMANCER_SNAPSHOT_INTERVAL', 5))
+VERSIONED_TABLES = ('names', 'leaders', 'weekly')
+# buffer votes in memory and write them in batches
+WRITE_BEHIND = os.environ.get('ONOMANCER_WRITE_BEHIND', '') not in ('', '0')
+FLUSH_INTERVAL = float(os.environ.get('ONOMANCER_FLUSH_INTERVAL', 1))
+FLUSH_BATCH = int(os.environ.get('ONOMANCER_FLUSH_BATCH', 200))
+LOOKUP_LIMIT = 200
+# batches of random ids sample_rows probes before giving up and sorting
+SAMPLE_ROUNDS = 4
+SAMPLE_BATCH = 500
+# points per egg chart by default, and how long a drawn chart is reused
+CHART_POINTS = 1000
+CHART_TTL = 60
+# rows per query when streaming a whole table out
+DUMP_CHUNK = 1000
+# rows per transaction when importing
+IMPORT_BATCH = 5000
+# player stats kept on leaders so names can be filtered by them
+PLAYER_COLUMNS = ('batting_stars', 'pitching_stars', 'baserunning_stars', 'defense_stars', 'soulscream_length')
+# rows per transaction when backfilling a migrated column, and the pause
+# between chunks that lets votes take the write lock
+BACKFILL_CHUNK = int(os.environ.get('ONOMANCER_BACKFILL_CHUNK', 1000))
+BACKFILL_PAUSE = float(os.environ.get('ONOMANCER_BACKFILL_PAUSE', 0.05))
+# days of votes the weekly board adds up, today included
+WEEKLY_DAYS = 7
 
 
 logger = logging.getLogger(__name__)
@@ -62,10 +109,126 @@ def debug_log():
         logger.debug(log)
 
 
+class PooledConnection(sqlite3.Connection):
+    """sqlite connection that hands itself back to the pool when it breaks"""
+
+    def __exit__(self, exc_type, exc, tb):
+        res = super().__exit__(exc_type, exc, tb)
+        if exc_type is not None and issubclass(exc_type, sqlite3.Error) and \
+                not issubclass(exc_type, sqlite3.IntegrityError):
+            _pool.reset(self)
+        return res
+
+
+class ConnectionPool:
+    """
+    One long lived connection per worker thread.
+
+    Connections are opened lazily, PRAGMAs are applied once, and a connection
+    is health checked before being handed out again after an error. At most
+    `size` connections are kept; threads past that get a throwaway connection.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conns = {}
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(DB_NAME, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(f'PRAGMA {pragma}')
+        conn.db_name = DB_NAME
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def get(self):
+        if os.getpid() != self._pid:
+            # forked (gunicorn preload), parent's connections are not ours to use
+            self._forget()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.db_name != DB_NAME:
+            self._discard(conn)
+            conn = None
+        if conn is not None:
+            if not getattr(self._local, 'suspect', False):
+                return conn
+            self._local.suspect = False
+            if self._healthy(conn):
+                return conn
+            self._discard(conn)
+
+        conn = self._open()
+        with self._lock:
+            self._prune()
+            if len(self._conns) < self.size:
+                self._conns[threading.get_ident()] = conn
+                self._local.conn = conn
+        return conn
+
+    def reset(self, conn):
+        """Called on error; next checkout from this thread is health checked"""
+        if getattr(self._local, 'conn', None) is conn:
+            if conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+            self._local.suspect = True
+
+    def resize(self, size):
+        with self._lock:
+            self.size = size
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._conns.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._conns = {}
+        self._local = threading.local()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._conns = {t: c for t, c in self._conns.items() if c is not conn}
+        self._local.conn = None
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _prune(self):
+        # drop connections owned by threads that have exited
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [t for t in self._conns if t not in alive]:
+            try:
+                self._conns.pop(ident).close()
+            except sqlite3.Error:
+                pass
+
+    def _forget(self):
+        self._conns = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+
+_pool = ConnectionPool()
+
+
 def connect():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _pool.get()
 
 
 def bootstrap():
@@ -92,7 +255,7 @@ def bootstrap():
             conn.execute('ALTER TABLE leaders ADD COLUMN naughty INTEGER DEFAULT 0')
             conn.execute('ALTER TABLE leaders ADD COLUMN flag TEXT')
             conn.execute('ALTER TABLE leaders ADD COLUMN guid TEXT')
-            conn.execute('CREATE UNIQUE INDEX idx_leaders_guid ON names (guid)')
+            conn.execute('CREATE UNIQUE INDEX idx_leaders_guid ON leaders (guid)')
         except Exception:
             pass
 
@@ -107,6 +270,7 @@ def bootstrap():
         except Exception:
             pass
 
+    migrate()
 
 
 def clear():
@@ -124,250 +288,1162 @@ def clear():
             conn.execute('DROP TABLE weekly')
         except Exception:
             pass
+        try:
+            conn.execute('DROP TABLE weekly_buckets')
+        except Exception:
+            pass
+        try:
+            conn.execute('DROP TABLE histograms')
+        except Exception:
+            pass
+        try:
+            conn.execute('DROP TABLE versions')
+        except Exception:
+            pass
+        try:
+            conn.execute('DROP TABLE schema_version')
+        except Exception:
+            pass
+        try:
+            conn.execute('DROP TABLE backfills')
+        except Exception:
+            pass
+        try:
+            conn.execute('DROP TABLE player_stats')
+        except Exception:
+            pass
+        for tbl in ('names_fts', 'leaders_fts'):
+            try:
+                conn.execute(f'DROP TABLE {tbl}')
+            except Exception:
+                pass
 
 
 def migrate():
+    """
+    Apply the MIGRATIONS this db hasn't had yet, each in its own transaction,
+    then run the backfills they left behind. Safe to rerun; an interrupted
+    backfill picks up where it stopped.
+    """
     conn = connect()
     with conn:
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied datetime default current_timestamp
+            )
+            '''
+        )
+        conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS backfills (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+            '''
+        )
+    for version, name, apply in MIGRATIONS:
+        with write() as conn:
+            # checked under the write lock, in case another process got here first
+            if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                continue
+            logger.info(f'migration {version}: {name}')
+            apply(conn)
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+    run_backfills()
+    compact_weekly()
+
+
+def _schedule_backfill(conn, name, after=0):
+    """
+    (Re)start backfill `name` from the row after id `after`, once the
+    transaction commits. One already running keeps going from wherever is earlier
+    """
+    conn.execute(
+        '''
+        INSERT INTO backfills (name, last_id) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            last_id = CASE WHEN done THEN excluded.last_id ELSE min(last_id, excluded.last_id) END,
+            done = 0
+        ''',
+        (name, after),
+    )
+
+
+def _backfill_end(conn, tbl, last_id, chunk):
+    """Last id of the next `chunk` rows of `tbl` after `last_id`; None when there are none"""
+    end = conn.execute(f'SELECT id FROM {tbl} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?', (last_id, chunk - 1)).fetchone()
+    end = end['id'] if end else conn.execute(f'SELECT MAX(id) AS m FROM {tbl}').fetchone()['m']
+    return end if end is not None and end > last_id else None
+
+
+def run_backfills(chunk=BACKFILL_CHUNK, pause=BACKFILL_PAUSE):
+    """
+    Run every unfinished backfill over its table in id order, `chunk` rows
+    per transaction, saving how far it got with each chunk. The chunk is
+    picked, and python backfills do their work, before its transaction opens.
+    """
+    with connect() as conn:
+        pending = [r['name'] for r in conn.execute('SELECT name FROM backfills WHERE done = 0 ORDER BY name')]
+    for name in pending:
+        tbl, fill = BACKFILLS[name]
+        while True:
+            with connect() as conn:
+                last_id = conn.execute('SELECT last_id FROM backfills WHERE name = ?', (name,)).fetchone()['last_id']
+                end = _backfill_end(conn, tbl, last_id, chunk)
+                updates = fill(conn, last_id, end) if callable(fill) and end is not None else None
+            with write() as conn:
+                if conn.execute('SELECT last_id FROM backfills WHERE name = ?', (name,)).fetchone()['last_id'] != last_id:
+                    # another process got there first, carry on from where it left off
+                    continue
+                if end is None:
+                    if _backfill_end(conn, tbl, last_id, 1) is None:
+                        # rows added from here on are filled in by whoever writes them
+                        conn.execute('UPDATE backfills SET done = 1 WHERE name = ?', (name,))
+                        break
+                    continue
+                if updates is None:
+                    conn.execute(fill, (last_id, end))
+                elif updates[1]:
+                    conn.executemany(*updates)
+                conn.execute('UPDATE backfills SET last_id = ? WHERE name = ?', (end, name))
+            logger.info(f'backfill {name}: up to {tbl} {end}')
+            time.sleep(pause)
+
+
+def backfill_guids():
+    with connect() as conn:
+        for name in ('leaders_guid', 'names_guid'):
+            _schedule_backfill(conn, name)
+    run_backfills()
+
+
+def _create_weekly_buckets(conn):
+    """
+    Votes per name per day. weekly holds the rolling sum of the last
+    WEEKLY_DAYS of buckets, kept current by _upvote and compact_weekly.
+    Returns whether the table is new.
+    """
+    try:
+        conn.execute(
+            '''
+            CREATE TABLE weekly_buckets (
+                name TEXT NOT NULL,
+                day TEXT NOT NULL,
+                votes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, day)
+            ) WITHOUT ROWID
+            '''
+        )
+    except Exception:
+        return False
+    conn.execute('CREATE INDEX idx_weekly_buckets_day ON weekly_buckets (day)')
+    return True
+
+
+# chart histograms: kind -> (table, columns it depends on, bucket of a {row})
+HISTOGRAMS = {
+    'leader_votes': ('leaders', 'votes', '{row}.votes'),
+    'egg_annotations': ('names', 'first_votes, second_votes', '{row}.first_votes - {row}.second_votes'),
+}
+
+
+def _create_histograms(conn):
+    """Row counts per bucket for the charts, moved by triggers as rows change"""
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS histograms (
+            kind TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (kind, bucket)
+        ) WITHOUT ROWID
+        '''
+    )
+    for kind, (tbl, cols, bucket) in HISTOGRAMS.items():
+        add = f'''
+            INSERT INTO histograms (kind, bucket, count)
+                SELECT '{kind}', {bucket.format(row='NEW')}, 1 WHERE {bucket.format(row='NEW')} IS NOT NULL
+            ON CONFLICT (kind, bucket)
+                DO UPDATE SET count = count + 1;
+        '''
+        remove = f'''
+            UPDATE histograms SET count = count - 1
+            WHERE kind = '{kind}' AND bucket = {bucket.format(row='OLD')};
+        '''
+        for trigger, event, body in (
+            (f'trg_{tbl}_hist_insert', f'AFTER INSERT ON {tbl}', add),
+            (f'trg_{tbl}_hist_delete', f'AFTER DELETE ON {tbl}', remove),
+            (f'trg_{tbl}_hist_update', f'AFTER UPDATE OF {cols} ON {tbl}', remove + add),
+        ):
+            conn.execute(
+                f'''
+                CREATE TRIGGER IF NOT EXISTS {trigger}
+                {event}
+                BEGIN
+                    {body}
+                END
+                '''
+            )
+
+
+def _histogram(kind):
+    with connect() as conn:
+        res = conn.execute('SELECT bucket, count FROM histograms WHERE kind = ? AND count > 0 ORDER BY bucket', (kind,)).fetchall()
+        return [r['count'] for r in res], [r['bucket'] for r in res]
+
+
+def _create_page_indexes(conn):
+    """
+    Keyset pages walk these in name order. Pages are by name, so votes
+    trails name in the leaders index rather than leading it.
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaders_page ON leaders (naughty, name, votes)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_names_good_name ON names (name) WHERE naughty = 0 AND is_bad = 0')
+
+
+def _create_egg_scores(conn):
+    """
+    score (upvotes+downvotes) and is_bad (BAD_EGG_CLAUSE) are kept on the row by
+    triggers so the good-egg queries can use the partial indexes below
+    """
+    for col in ('score', 'is_bad'):
+        try:
+            conn.execute(f'ALTER TABLE names ADD COLUMN {col} INTEGER DEFAULT 0')
+        except Exception:
+            pass
+    for trigger, event in (
+        ('trg_names_score_insert', 'AFTER INSERT ON names'),
+        ('trg_names_score_update', 'AFTER UPDATE OF upvotes, downvotes ON names'),
+    ):
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS {trigger}
+            {event}
+            BEGIN
+                UPDATE names
+                SET
+                    score = upvotes + downvotes,
+                    is_bad = {BAD_EGG_CLAUSE}
+                WHERE id = NEW.id;
+            END
+            '''
+        )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_names_good_score ON names (score, name) WHERE naughty = 0 AND is_bad = 0')
+
+
+def _egg_id_sql(col, which):
+    """SQL for the id of the first or second egg of full name `col`"""
+    if which == 'first':
+        egg = f"CASE WHEN instr({col}, ' ') THEN substr({col}, 1, instr({col}, ' ') - 1) ELSE {col} END"
+    else:
+        egg = f"CASE WHEN instr({col}, ' ') THEN substr({col}, instr({col}, ' ') + 1) END"
+    return f'(SELECT id FROM names WHERE names.name = {egg})'
+
+
+def _create_egg_pairs(conn):
+    """leaders point at their eggs, so egg -> name lookups are index joins instead of LIKE scans"""
+    for col in ('first_egg_id', 'second_egg_id'):
+        try:
+            conn.execute(f'ALTER TABLE leaders ADD COLUMN {col} INTEGER REFERENCES names (id)')
+        except Exception:
+            pass
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaders_first_egg ON leaders (first_egg_id, votes)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaders_second_egg ON leaders (second_egg_id, votes)')
+    conn.execute(
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_leaders_egg_pair
+        AFTER INSERT ON leaders
+        WHEN NEW.first_egg_id IS NULL
+        BEGIN
+            UPDATE leaders SET
+                first_egg_id = {_egg_id_sql('NEW.name', 'first')},
+                second_egg_id = {_egg_id_sql('NEW.name', 'second')}
+            WHERE id = NEW.id;
+        END
+        '''
+    )
+
+
+def _player_values(core):
+    """PLAYER_COLUMNS of generated player stats `core`, in order"""
+    return tuple(len(core['soulscream']) if col == 'soulscream_length' else core[col] for col in PLAYER_COLUMNS)
+
+
+def _player_columns_update(names, cores):
+    """(sql, params) setting PLAYER_COLUMNS of leaders `names` from their player `cores`, where unset"""
+    return (
+        f'UPDATE leaders SET {", ".join(f"{c} = ?" for c in PLAYER_COLUMNS)} WHERE name = ? AND {PLAYER_COLUMNS[0]} IS NULL',
+        [(*_player_values(core), name) for name, core in zip(names, cores)],
+    )
+
+
+# leader inserts: the columns, their placeholders, and the upsert filling them in where unset
+_PLAYER_COLUMNS_SQL = ', '.join(PLAYER_COLUMNS)
+_PLAYER_VALUES_SQL = ', '.join(['?'] * len(PLAYER_COLUMNS))
+_PLAYER_FILL_SQL = ', '.join(f'{c} = coalesce({c}, excluded.{c})' for c in PLAYER_COLUMNS)
+_NO_PLAYER = (None,) * len(PLAYER_COLUMNS)
+
+
+def _new_players(names):
+    """
+    name -> PLAYER_COLUMNS values for whichever of `names` aren't leaders with
+    them set yet, new names included, from the player cache. Call it before
+    taking the write lock; generating players shouldn't hold that up.
+    """
+    names = list(dict.fromkeys(names))
+    done = set()
+    with connect() as conn:
+        for chunk in range(0, len(names), 500):
+            batch = names[chunk:chunk + 500]
+            done.update(
+                r['name'] for r in conn.execute(
+                    f'SELECT name FROM leaders WHERE name IN ({",".join(["?"] * len(batch))}) AND ({PLAYER_COLUMNS[0]} IS NOT NULL OR naughty = -1)',
+                    batch,
+                )
+            )
+    todo = [n for n in names if n not in done]
+    if not todo:
+        return {}
+    # players imports this module
+    from onomancer import players
+    # not saved: the write this is for would take a second transaction
+    stats = players.get_stats(todo, save=False)
+    return {n: _player_values(stats[n]) for n in todo}
+
+
+def _create_player_columns(conn):
+    """
+    leaders carry their player's stars so names can be filtered by them.
+    Whoever inserts a leader fills them in, see _new_players
+    """
+    for col in PLAYER_COLUMNS:
+        try:
+            conn.execute(f'ALTER TABLE leaders ADD COLUMN {col} REAL')
+        except Exception:
+            pass
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_leaders_{col} ON leaders ({col})')
+
+
+def _fts_indexed(tbl, id_):
+    # the fts5 docsize shadow table has a row per indexed document. Rows the
+    # search backfill hasn't reached yet must not be deleted from the index
+    return f'EXISTS (SELECT 1 FROM {tbl}_fts_docsize WHERE id = {id_})'
+
+
+def _create_search(conn):
+    """
+    Trigram full text indexes over egg and full names, for substring lookups.
+    Triggers keep new rows indexed; existing ones are the search backfills'.
+    """
+    for tbl in ('names', 'leaders'):
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {tbl}_fts USING fts5(name, content='{tbl}', content_rowid='id', tokenize='trigram')")
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_insert
+            AFTER INSERT ON {tbl}
+            BEGIN
+                INSERT INTO {tbl}_fts (rowid, name) VALUES (NEW.id, NEW.name);
+            END
+            '''
+        )
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_delete
+            AFTER DELETE ON {tbl}
+            WHEN {_fts_indexed(tbl, 'OLD.id')}
+            BEGIN
+                INSERT INTO {tbl}_fts ({tbl}_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            END
+            '''
+        )
+        conn.execute(
+            f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{tbl}_fts_update
+            AFTER UPDATE OF name ON {tbl}
+            WHEN {_fts_indexed(tbl, 'OLD.id')}
+            BEGIN
+                INSERT INTO {tbl}_fts ({tbl}_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+                INSERT INTO {tbl}_fts (rowid, name) VALUES (NEW.id, NEW.name);
+            END
+            '''
+        )
+
+
+def _create_versions(conn):
+    """Per-table write counters, bumped by triggers, so in-memory snapshots know when to reload"""
+    conn.execute('CREATE TABLE IF NOT EXISTS versions (tbl TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)')
+    for tbl in VERSIONED_TABLES:
+        conn.execute('INSERT OR IGNORE INTO versions (tbl, version) VALUES (?, 0)', (tbl,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(
+                f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{tbl}_version_{op.lower()}
+                AFTER {op} ON {tbl}
+                BEGIN
+                    UPDATE versions SET version = version + 1 WHERE tbl = '{tbl}';
+                END
+                '''
+            )
+
+
+def _create_leaders_modified(conn):
+    """
+    leaders.modified is the leaders version of the row's last write, so the
+    crawl graph can reload only what moved since it last looked, see
+    _refresh_egg_graph. The leaders version triggers stamp it. Deletes leave
+    nothing to find that way and bump a leaders_deleted version instead.
+    """
+    try:
+        conn.execute('ALTER TABLE leaders ADD COLUMN modified INTEGER')
+    except Exception:
+        pass
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaders_modified ON leaders (modified)')
+    conn.execute("INSERT OR IGNORE INTO versions (tbl, version) VALUES ('leaders_deleted', 0)")
+    bump = "UPDATE versions SET version = version + 1 WHERE tbl = '{}';"
+    stamp = "UPDATE leaders SET modified = (SELECT version FROM versions WHERE tbl = 'leaders') WHERE id = NEW.id;"
+    # the stamp changes modified, which keeps it from bumping the version again
+    for op, when, body in (
+        ('insert', '', bump.format('leaders') + stamp),
+        ('update', 'WHEN NEW.modified IS OLD.modified', bump.format('leaders') + stamp),
+        ('delete', '', bump.format('leaders') + bump.format('leaders_deleted')),
+    ):
+        conn.execute(f'DROP TRIGGER IF EXISTS trg_leaders_version_{op}')
+        conn.execute(
+            f'''
+            CREATE TRIGGER trg_leaders_version_{op}
+            AFTER {op.upper()} ON leaders
+            {when}
+            BEGIN
+                {body}
+            END
+            '''
+        )
+
+
+# a random (version 4) uuid, for filling guids without a round trip per row
+UUID_SQL = '''
+(
+    lower(hex(randomblob(4))) || '-' ||
+    lower(hex(randomblob(2))) || '-4' ||
+    substr(lower(hex(randomblob(2))), 2) || '-' ||
+    substr('89ab', 1 + abs(random() % 4), 1) ||
+    substr(lower(hex(randomblob(2))), 2) || '-' ||
+    lower(hex(randomblob(6)))
+)
+'''
+
+def _fts_backfill_sql(tbl):
+    # ?1 / ?2 are the id range; rows the insert trigger already indexed are skipped
+    return f'''
+        INSERT INTO {tbl}_fts (rowid, name)
+        SELECT id, name FROM {tbl}
+        WHERE id > ?1 AND id <= ?2 AND NOT {_fts_indexed(tbl, f'{tbl}.id')}
+    '''
+
+
+def _fill_leaders_player(conn, lo, hi):
+    """leaders_player backfill: generates the players of the chunk, outside its transaction"""
+    # players imports this module
+    from onomancer import players
+    names = [r['name'] for r in conn.execute(f'SELECT name FROM leaders WHERE id > ? AND id <= ? AND {PLAYER_COLUMNS[0]} IS NULL', (lo, hi))]
+    # straight from the generator, a backfill would only churn the player cache
+    return _player_columns_update(names, players.generate_many(names))
+
+
+# backfill name -> (table, UPDATE over the id range (?, ?]), or (table,
+# fill(conn, lo, hi)) returning (sql, params) to executemany over that range
+BACKFILLS = {
+    'egg_scores': (
+        'names',
+        f'UPDATE names SET score = upvotes + downvotes, is_bad = {BAD_EGG_CLAUSE} WHERE id > ? AND id <= ?',
+    ),
+    'egg_pairs': (
+        'leaders',
+        f'''
+        UPDATE leaders SET
+            first_egg_id = {_egg_id_sql('leaders.name', 'first')},
+            second_egg_id = {_egg_id_sql('leaders.name', 'second')}
+        WHERE id > ? AND id <= ? AND first_egg_id IS NULL
+        ''',
+    ),
+    'leaders_guid': ('leaders', f'UPDATE leaders SET guid = {UUID_SQL} WHERE id > ? AND id <= ? AND guid IS NULL'),
+    'leaders_player': ('leaders', _fill_leaders_player),
+    'names_guid': ('names', f'UPDATE names SET guid = {UUID_SQL} WHERE id > ? AND id <= ? AND guid IS NULL'),
+    'names_fts': ('names', _fts_backfill_sql('names')),
+    'leaders_fts': ('leaders', _fts_backfill_sql('leaders')),
+}
+
+
+def _migrate_weekly(conn):
+    try:
         conn.execute('CREATE TABLE weekly (name TEXT NOT NULL, votes INTEGER, dt datetime default current_timestamp)')
         conn.execute('CREATE UNIQUE INDEX idx_weekly_name ON weekly (name)')
+    except Exception:
+        pass
 
 
-def add_name(name):
-    name = name.replace(' ', u"\u00A0")  # replace with nonbreaking space
+def _migrate_egg_scores(conn):
+    _create_egg_scores(conn)
+    _schedule_backfill(conn, 'egg_scores')
+
+
+def _migrate_search(conn):
+    _create_search(conn)
+    _schedule_backfill(conn, 'names_fts')
+    _schedule_backfill(conn, 'leaders_fts')
+
+
+def _migrate_egg_pairs(conn):
+    _create_egg_pairs(conn)
+    _schedule_backfill(conn, 'egg_pairs')
+
+
+def _migrate_weekly_buckets(conn):
+    if _create_weekly_buckets(conn):
+        # each old tally becomes one bucket on the day it was first voted on
+        conn.execute('INSERT INTO weekly_buckets (name, day, votes) SELECT name, date(dt), votes FROM weekly')
+
+
+def _migrate_histograms(conn):
+    _create_histograms(conn)
+    # count from scratch, the triggers keep it from here
+    conn.execute('DELETE FROM histograms')
+    for kind, (tbl, _, bucket) in HISTOGRAMS.items():
+        bucket = bucket.format(row=tbl)
+        conn.execute(
+            f'INSERT INTO histograms (kind, bucket, count) SELECT ?, {bucket}, count(*) FROM {tbl} WHERE {bucket} IS NOT NULL GROUP BY 2',
+            (kind,),
+        )
+
+
+def _migrate_guids(conn):
+    _schedule_backfill(conn, 'leaders_guid')
+    _schedule_backfill(conn, 'names_guid')
+
+
+def _migrate_indexes(conn):
+    """
+    idx_leaders_guid used to be created on names by mistake, leaving guid
+    lookups on leaders to scan. Also covers the moderation and board filters.
+    """
+    row = conn.execute("SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = 'idx_leaders_guid'").fetchone()
+    if row and row['tbl_name'] != 'leaders':
+        conn.execute('DROP INDEX idx_leaders_guid')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_leaders_guid ON leaders (guid)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_leaders_naughty_votes ON leaders (naughty, votes)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_names_naughty ON names (naughty)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_weekly_votes ON weekly (votes)')
+
+
+def _create_player_stats(conn):
+    """Generated player stats (json) by name, see onomancer.players"""
+    conn.execute(
+        '''
+        CREATE TABLE IF NOT EXISTS player_stats (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            stats TEXT NOT NULL
+        )
+        '''
+    )
+
+
+def _migrate_player_columns(conn):
+    _create_player_columns(conn)
+    _schedule_backfill(conn, 'leaders_player')
+
+
+# (version, name, apply(conn)), applied in order and recorded in schema_version.
+# Never renumber or edit one that has shipped; add a new one instead.
+MIGRATIONS = [
+    (1, 'weekly', _migrate_weekly),
+    (2, 'versions', _create_versions),
+    (3, 'egg scores', _migrate_egg_scores),
+    (4, 'search', _migrate_search),
+    (5, 'egg pairs', _migrate_egg_pairs),
+    (6, 'weekly buckets', _migrate_weekly_buckets),
+    (7, 'page indexes', _create_page_indexes),
+    (8, 'histograms', _migrate_histograms),
+    (9, 'guids', _migrate_guids),
+    (10, 'indexes', _migrate_indexes),
+    (11, 'player stats', _create_player_stats),
+    (12, 'player columns', _migrate_player_columns),
+    (13, 'leaders modified', _create_leaders_modified),
+]
+
+
+def _table_versions(conn, tables):
+    rows = conn.execute(
+        f'SELECT tbl, version FROM versions WHERE tbl IN ({",".join(["?"] * len(tables))})',
+        tables,
+    ).fetchall()
+    versions = {r['tbl']: r['version'] for r in rows}
+    return tuple(versions.get(t) for t in tables)
+
+
+class Snapshot:
+    """
+    A per-process, in-memory structure built from the db by `load(conn)`.
+
+    It is rebuilt when the version counters of `tables` move, checked at
+    most once every `interval` seconds so hot paths stay free of sqlite.
+    With `refresh(conn, value, seen, version)` it is patched instead where
+    that can be done, going from versions `seen` to `version`; returning
+    None falls back to a rebuild.
+    """
+
+    def __init__(self, tables, load, interval=None, refresh=None):
+        self.tables = tables
+        self.load = load
+        self.refresh = refresh
+        self.interval = SNAPSHOT_INTERVAL if interval is None else interval
+        self.value = None
+        self.version = None
+        self.checked = 0
+        self._lock = threading.Lock()
+
+    def get(self, conn):
+        if self.value is not None and time.monotonic() - self.checked < self.interval:
+            return self.value
+        with self._lock:
+            if self.value is not None and time.monotonic() - self.checked < self.interval:
+                return self.value
+            version = _table_versions(conn, self.tables)
+            if self.value is None or version != self.version:
+                value = None
+                if self.refresh is not None and self.loaded:
+                    value = self.refresh(conn, self.value, self.version, version)
+                self.value = self.load(conn) if value is None else value
+                self.version = version
+            self.checked = time.monotonic()
+        return self.value
+
+    def invalidate(self):
+        self.checked = 0
+        self.version = None
+
+    @property
+    def loaded(self):
+        return self.value is not None and self.version is not None
+
+
+@contextmanager
+def write(*snapshots):
+    """
+    Write transaction that keeps `snapshots` current.
+
+    Takes the write lock up front so nobody else can commit in between; if a
+    snapshot was in sync when we started, the caller patches it in memory and
+    it is marked in sync again afterwards instead of being reloaded.
+    """
     conn = connect()
-    with conn:
-        conn.execute('INSERT INTO names (name, upvotes, downvotes, naughty, guid) VALUES (?, 0, 0, 1, ?) ON CONFLICT (name) DO UPDATE SET upvotes = upvotes', (name, str(uuid.uuid4())))
+    try:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            before = [_table_versions(conn, s.tables) for s in snapshots]
+            yield conn
+            after = [_table_versions(conn, s.tables) for s in snapshots]
+    except Exception:
+        for snapshot in snapshots:
+            snapshot.invalidate()
+        raise
+    for snapshot, b, a in zip(snapshots, before, after):
+        if snapshot.version == b:
+            snapshot.version = a
+
+
+def sample_rows(conn, table, where='1', params=(), k=1, columns='*'):
+    """
+    Up to k distinct rows of `table` matching `where`, uniformly at random and
+    in random order; `columns` must include id.
+
+    Probes random ids in batches and keeps the rows that exist and match, so
+    the work goes with k over the share of ids that match instead of the
+    size of the table. Falls back to ORDER BY RANDOM() when matches are too
+    sparse to find that way.
+    """
+    if k <= 0:
+        return []
+    bounds = conn.execute(f'SELECT (SELECT min(id) FROM {table}) AS lo, (SELECT max(id) FROM {table}) AS hi').fetchone()
+    if bounds['lo'] is None:
+        return []
+    lo, span = bounds['lo'], bounds['hi'] - bounds['lo'] + 1
+    probed = set()
+    rows = []
+    hits = 0
+    for _ in range(SAMPLE_ROUNDS):
+        need = k - len(rows)
+        left = span - len(probed)
+        if need <= 0 or left <= 0:
+            return rows
+        # guess how many ids it takes to find what's still needed
+        hit_rate = max(hits, 1) / max(len(probed), 1) if probed else 0.5
+        m = min(left, SAMPLE_BATCH, max(2 * need, math.ceil(1.5 * need / hit_rate)))
+        if left <= 2 * m:
+            ids = random.sample([i for i in range(lo, lo + span) if i not in probed], m)
+        else:
+            ids = []
+            while len(ids) < m:
+                i = lo + random.randrange(span)
+                if i not in probed:
+                    probed.add(i)
+                    ids.append(i)
+        probed.update(ids)
+        found = {
+            r['id']: r for r in conn.execute(
+                f'SELECT {columns} FROM {table} NOT INDEXED WHERE id IN ({",".join(["?"] * len(ids))}) AND ({where})',
+                (*ids, *params),
+            )
+        }
+        hits += len(found)
+        # keep the draw order, the first k matches of a random permutation are a uniform sample
+        rows.extend(found[i] for i in ids if i in found)
+        del rows[k:]
+    if len(rows) >= k or len(probed) >= span:
+        return rows
+    return conn.execute(
+        f'SELECT {columns} FROM {table} WHERE {where} ORDER BY RANDOM() LIMIT ?',
+        (*params, k),
+    ).fetchall()
+
+
+def add_name(name):
+    name = egg_name(name)
+    guid = str(uuid.uuid4())
+    with write(_score_index) as conn:
+        row = conn.execute('INSERT INTO names (name, upvotes, downvotes, naughty, guid) VALUES (?, 0, 0, 1, ?) ON CONFLICT (name) DO UPDATE SET upvotes = upvotes RETURNING upvotes, downvotes, guid', (name, guid)).fetchone()
+        if row['guid'] == guid:
+            _egg_changed(None, row)
     return name
 
 
 def upvote_name(name, thumbs=1, hit_eggs=True):
-    conn = connect()
-    with conn:
-        eggs = [e.replace(' ', u'\u00A0') for e in name.split(' ', 1)]
-        name = ' '.join(eggs)
-
-        existing = conn.execute('SELECT * FROM leaders WHERE name = ?', (name,)).fetchone()
-        naughty = 0
-        if existing:
-            if existing['naughty'] == -1:
-                # rejected, throw away everything
-                return
-            if existing['naughty'] == 1:
-                # has been validated
-                naughty = 1
-        else:
-            # doesn't exist, do insertions
-            for egg in eggs:
-                n = conn.execute('SELECT * FROM names WHERE name = ?', (egg,)).fetchone()
-                if not n:
-                    conn.execute('INSERT INTO names (name, upvotes, downvotes, naughty, guid) VALUES (?, 0, 0, 1, ?)', (egg, str(uuid.uuid4())))
-                if not n or n['naughty'] != 0:
-                    naughty = 1
-
-        if hit_eggs:
-            for egg in eggs:
-                if thumbs > 0:
-                    conn.execute(
-                        'UPDATE names SET upvotes = upvotes + ? WHERE name = ?',
-                        (thumbs, egg))
-                elif thumbs < 0:
-                    conn.execute(
-                        'UPDATE names SET downvotes = downvotes + ? WHERE name = ?',
-                        (thumbs, egg))
-
-        mult = 1
-        if thumbs < 0 and check_egg_threshold(name, c=conn):
-            mult = 2
+    eggs = split_full_name(name)
+    name = ' '.join(eggs)
+    if WRITE_BEHIND and thumbs:
+        _vote_buffer.add(name, thumbs, hit_eggs)
+        return
+    player = _new_players([name]).get(name)
+    with write(_score_index, _egg_graph, _leaderboard, _weekly) as conn:
+        _upvote(conn, name, VoteDelta.of(thumbs, hit_eggs), player)
 
-        conn.execute('INSERT INTO leaders (name, votes, naughty, guid) VALUES (?, 1, ?, ?) ON CONFLICT (name) DO UPDATE SET votes = votes + ?', (name, naughty, str(uuid.uuid4()), thumbs * mult))
 
-        try:
-            conn.execute(
+def _upvote(conn, name, delta, player=None):
+    """
+    Apply a (possibly coalesced) VoteDelta to a normalized name.
+
+    One lookup of the leader, then one upsert each for its eggs, the leader
+    and the weekly tally. `player` is the leader's PLAYER_COLUMNS values when
+    they aren't set yet, see _new_players.
+    """
+    eggs = name.split(' ', 1)
+    existing = conn.execute('SELECT naughty FROM leaders WHERE name = ?', (name,)).fetchone()
+    naughty = 0
+    egg_rows = None
+    if existing:
+        if existing['naughty'] == -1:
+            # rejected, throw away everything
+            return
+        if existing['naughty'] == 1:
+            # has been validated
+            naughty = 1
+        if delta.egg_up or delta.egg_down:
+            unique = set(eggs)
+            # "Egg Egg" gets hit twice
+            hits = len(eggs) - len(unique) + 1
+            up, down = delta.egg_up * hits, delta.egg_down * hits
+            egg_rows = conn.execute(
+                f'''
+                UPDATE names
+                SET upvotes = upvotes + ?, downvotes = downvotes + ?
+                WHERE name IN ({",".join(["?"] * len(unique))})
+                RETURNING upvotes, downvotes
+                ''',
+                [up, down] + list(unique),
+            ).fetchall()
+            for new in egg_rows:
+                _egg_changed({'upvotes': new['upvotes'] - up, 'downvotes': new['downvotes'] - down}, new)
+    else:
+        # doesn't exist, insert the eggs as they come and take the votes in the same go
+        egg_rows = []
+        for egg in eggs:
+            guid = str(uuid.uuid4())
+            new = conn.execute(
                 '''
-                INSERT INTO weekly (name, votes)
-                    VALUES (?, ?) 
+                INSERT INTO names (name, upvotes, downvotes, naughty, guid)
+                    VALUES (?, ?, ?, 1, ?)
                 ON CONFLICT (name)
-                    DO UPDATE SET votes = votes + ?
+                    DO UPDATE SET upvotes = upvotes + excluded.upvotes, downvotes = downvotes + excluded.downvotes
+                RETURNING upvotes, downvotes, naughty, guid
                 ''',
-                (name, thumbs, thumbs)
-            )
-        except Exception:
-            pass
+                (egg, delta.egg_up, delta.egg_down, guid),
+            ).fetchone()
+            if new['guid'] == guid:
+                _egg_changed(None, {'upvotes': 0, 'downvotes': 0})
+                old = {'upvotes': 0, 'downvotes': 0}
+            else:
+                old = {'upvotes': new['upvotes'] - delta.egg_up, 'downvotes': new['downvotes'] - delta.egg_down}
+            _egg_changed(old, new)
+            egg_rows.append(new)
+            if new['naughty'] != 0:
+                naughty = 1
+
+    mult = 1
+    if delta.down < 0:
+        if egg_rows is None:
+            good = check_egg_threshold(name, c=conn)
+        else:
+            good = any(not is_bad_egg(r['upvotes'], r['downvotes']) for r in egg_rows)
+        if good:
+            mult = 2
 
+    votes = delta.up + delta.down * mult
+    # new names start on 1, the rest of a coalesced batch still counts
+    first = delta.first or 0
+    rest = votes - (first * mult if first < 0 else first)
+    if player is None:
+        leader = conn.execute(
+            'INSERT INTO leaders (name, votes, naughty, guid) VALUES (?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET votes = votes + ? RETURNING *',
+            (name, 1 + rest, naughty, str(uuid.uuid4()), votes),
+        ).fetchone()
+    else:
+        leader = conn.execute(
+            f'''
+            INSERT INTO leaders (name, votes, naughty, guid, {_PLAYER_COLUMNS_SQL}) VALUES (?, ?, ?, ?, {_PLAYER_VALUES_SQL})
+            ON CONFLICT (name) DO UPDATE SET votes = votes + ?, {_PLAYER_FILL_SQL}
+            RETURNING *
+            ''',
+            (name, 1 + rest, naughty, str(uuid.uuid4()), *player, votes),
+        ).fetchone()
+    _leader_changed(leader)
 
-def get_weekly(top=50, lookback=None):
-    lookback = None or datetime.timedelta(days=7)
-    after = datetime.datetime.utcnow() - lookback
-    with connect() as c:
-        rows = c.execute(
+    try:
+        conn.execute(
             '''
-            SELECT
-                weekly.name as name,
-                weekly.votes as votes,
-                leaders.guid as guid,
-                weekly.dt as dt
-            FROM weekly
-            JOIN leaders
-                ON weekly.name = leaders.name
-            WHERE
-                leaders.naughty = 0 AND
-                weekly.votes >= 0 AND
-                weekly.dt >= ?
-            ORDER BY weekly.votes DESC, RANDOM()
-            LIMIT ?
+            INSERT INTO weekly_buckets (name, day, votes)
+                VALUES (?, date('now'), ?)
+            ON CONFLICT (name, day)
+                DO UPDATE SET votes = votes + excluded.votes
+            ''',
+            (name, delta.votes)
+        )
+        weekly = conn.execute(
+            '''
+            INSERT INTO weekly (name, votes)
+                VALUES (?, ?)
+            ON CONFLICT (name)
+                DO UPDATE SET votes = votes + excluded.votes, dt = current_timestamp
+            RETURNING name, votes, dt
             ''',
-            (after, top)
+            (name, delta.votes)
+        ).fetchone()
+        _weekly_changed(dict(weekly, guid=leader['guid']), leader['naughty'] == 0)
+    except Exception:
+        pass
+
+
+def _flush_votes(batch):
+    players = _new_players(batch)
+    with write(_score_index, _egg_graph, _leaderboard, _weekly) as conn:
+        for name, delta in batch.items():
+            _upvote(conn, name, delta, players.get(name))
+
+
+_vote_buffer = VoteBuffer(_flush_votes, interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH)
+
+
+def flush_votes():
+    """Write out any buffered votes now"""
+    _vote_buffer.flush()
+
+
+def _with_pending(rows):
+    """Fold buffered, unflushed votes into rows read back from the db"""
+    if not len(_vote_buffer):
+        return rows
+    for row in rows:
+        row['votes'] += _vote_buffer.pending(row['name'])
+    return rows
+
+
+def get_weekly(top=50):
+    _maybe_compact_weekly()
+    if top > TOP_K:
+        with connect() as c:
+            rows = c.execute(
+                '''
+                SELECT
+                    weekly.name as name,
+                    weekly.votes as votes,
+                    leaders.guid as guid,
+                    weekly.dt as dt
+                FROM weekly
+                JOIN leaders
+                    ON weekly.name = leaders.name
+                WHERE
+                    leaders.naughty = 0 AND
+                    weekly.votes >= 0
+                ORDER BY weekly.votes DESC, RANDOM()
+                LIMIT ?
+                ''',
+                (top,)
+            )
+            return sorted(_with_pending([dict(row) for row in rows]), key=lambda r: -r['votes'])
+    with connect() as c:
+        board = _weekly.get(c)
+        if board.short:
+            _weekly.invalidate()
+            board = _weekly.get(c)
+    return sorted(_with_pending(board.top.top(top)), key=lambda r: -r['votes'])
+
+
+def compact_weekly():
+    """Take expired day buckets off the weekly totals and drop them"""
+    cutoff = f'-{WEEKLY_DAYS - 1} days'
+    with write() as conn:
+        expired = conn.execute(
+            "SELECT name, SUM(votes) AS votes FROM weekly_buckets INDEXED BY idx_weekly_buckets_day WHERE day < date('now', ?) GROUP BY name",
+            (cutoff,),
+        ).fetchall()
+        if not expired:
+            return 0
+        conn.executemany('UPDATE weekly SET votes = votes - ? WHERE name = ?', [(r['votes'], r['name']) for r in expired])
+        conn.execute("DELETE FROM weekly_buckets WHERE day < date('now', ?)", (cutoff,))
+        conn.executemany(
+            'DELETE FROM weekly WHERE name = ? AND NOT EXISTS (SELECT 1 FROM weekly_buckets WHERE name = ?)',
+            [(r['name'], r['name']) for r in expired],
         )
-        return [dict(row) for row in rows]
+    return len(expired)
+
+
+_weekly_compacted = None
+
+
+def _maybe_compact_weekly():
+    """Compact once a day per process, on the first weekly read after midnight (utc)"""
+    global _weekly_compacted
+    today = datetime.datetime.utcnow().date()
+    if _weekly_compacted != today:
+        _weekly_compacted = today
+        compact_weekly()
 
 
 def flip_leader(name):
     """Flip leaderboard name turnwise"""
+    players = _new_players([_flipped(name)])
     with connect() as c:
-        me = c.execute('SELECT * FROM leaders WHERE name=?', (name,)).fetchone()
-        flipped = ' '.join(name.split(' ')[::-1])
-        sibling = c.execute('SELECT * FROM leaders WHERE name = ?', (flipped,)).fetchone()
-        if not sibling:
-            c.execute('INSERT INTO leaders (name, votes, naughty, guid) VALUES (?, 0, 0, ?)', (flipped, str(uuid.uuid4())))
-            sibling_votes = 0
-        else:
-            sibling_votes = sibling['votes']
-        c.execute('UPDATE leaders SET votes=? WHERE name=?', (me['votes'], flipped))
-        c.execute('UPDATE leaders SET votes=? WHERE name=?', (sibling_votes, name))
+        _flip(c, name, players)
+
+
+def _flipped(name):
+    return ' '.join(name.split(' ')[::-1])
+
+
+def _flip(c, name, players=None):
+    """Swap the votes of `name` and its flipped sibling, see _new_players for `players`"""
+    flipped = _flipped(name)
+    players = players or {}
+    votes = {
+        r['name']: r['votes'] for r in
+        c.execute('SELECT name, votes FROM leaders WHERE name IN (?, ?)', (name, flipped))
+    }
+    if name not in votes:
+        return
+    # swap, creating the sibling if it has never been seen
+    rows = c.execute(
+        f'''
+        INSERT INTO leaders (name, votes, naughty, guid, {_PLAYER_COLUMNS_SQL})
+            VALUES (?, ?, 0, ?, {_PLAYER_VALUES_SQL}), (?, ?, 0, ?, {_PLAYER_VALUES_SQL})
+        ON CONFLICT (name)
+            DO UPDATE SET votes = excluded.votes, {_PLAYER_FILL_SQL}
+        RETURNING *
+        ''',
+        (
+            flipped, votes[name], str(uuid.uuid4()), *players.get(flipped, _NO_PLAYER),
+            name, votes.get(flipped, 0), str(uuid.uuid4()), *players.get(name, _NO_PLAYER),
+        ),
+    ).fetchall()
+    for row in rows:
+        _leader_changed(row)
 
 
 def get_leaders(top=20):
-    conn = connect()
-    with conn:
-        rows = conn.execute(f'SELECT * FROM leaders WHERE naughty = 0 AND votes > {LEADER_THRESHOLD} ORDER BY votes DESC, RANDOM() LIMIT ?', (top,))
-        return [dict(row) for row in rows]
+    if top > TOP_K:
+        with connect() as conn:
+            rows = conn.execute(f'SELECT * FROM leaders WHERE naughty = 0 AND votes > {LEADER_THRESHOLD} ORDER BY votes DESC, RANDOM() LIMIT ?', (top,))
+            return sorted(_with_pending([dict(row) for row in rows]), key=lambda r: -r['votes'])
+    with connect() as conn:
+        board = _leaderboard.get(conn)
+        if board.short:
+            _leaderboard.invalidate()
+            board = _leaderboard.get(conn)
+    return sorted(_with_pending(board.top(top)), key=lambda r: -r['votes'])
 
 
-def get_random_name():
-    conn = connect()
-    with connect() as conn, debug_log() as log:
-        if random.random() > .5:
-            log['mode'] = 'eggs'
-            lower = conn.execute(
-                f'''
-                SELECT upvotes+downvotes as r
-                FROM names
-                WHERE
-                    NOT {BAD_EGG_CLAUSE}
-                ORDER BY upvotes+downvotes
-                LIMIT 1
-                OFFSET (SELECT COUNT(*) FROM names)/2
-                '''
-            ).fetchone()['r']
+def _load_egg_snapshot(conn):
+    rows = conn.execute(
+        f'''
+        SELECT id, name, score, first_votes, second_votes, naughty
+        FROM names
+        WHERE
+            is_bad = 0
+        ORDER BY score, id
+        '''
+    )
+    return EggSnapshot(rows, ANNOTATE_THRESHOLD)
 
-            order = 'RANDOM()'
-            limit = 1
-            min_ = -2
-            if random.random() < .05:
-                order = 'upvotes+downvotes AND RANDOM()'
-                limit = 200
-            if random.random() < 0.3:
-                min_ = lower
 
+def _load_score_index(conn):
+    total = conn.execute('SELECT COUNT(*) AS c FROM names').fetchone()['c']
+    rows = conn.execute('SELECT score FROM names WHERE is_bad = 0')
+    return ScoreIndex((r['score'] for r in rows), total=total)
+
+
+def _load_top(conn, query, params=()):
+    """TopK over `query`, any select with a votes column"""
+    floor = conn.execute(f'SELECT votes FROM ({query}) ORDER BY votes DESC LIMIT 1 OFFSET ?', (*params, TOP_K - 1)).fetchone()
+    if floor is None:
+        return TopK(conn.execute(query, params), complete=True)
+    # the whole bucket at the cut, so ties can be broken fairly
+    return TopK(conn.execute(f'SELECT * FROM ({query}) WHERE votes >= ?', (*params, floor['votes'])))
+
+
+def _load_leaderboard(conn):
+    return _load_top(conn, f'SELECT * FROM leaders WHERE naughty = 0 AND votes > {LEADER_THRESHOLD}')
+
+
+def _load_weekly(conn):
+    query = '''
+        SELECT
+            weekly.name as name,
+            weekly.votes as votes,
+            leaders.guid as guid,
+            weekly.dt as dt
+        FROM weekly
+        JOIN leaders
+            ON weekly.name = leaders.name
+        WHERE
+            leaders.naughty = 0 AND
+            weekly.votes >= 0
+    '''
+    drawable = conn.execute('SELECT weekly.name AS name FROM weekly JOIN leaders ON weekly.name = leaders.name WHERE leaders.naughty = 0 AND weekly.votes > 0')
+    return WeeklyBoard(_load_top(conn, query), (r['name'] for r in drawable))
+
+
+def _load_egg_graph(conn):
+    return EggGraph(conn.execute('SELECT name, votes FROM leaders WHERE naughty = 0'))
+
+
+def _refresh_egg_graph(conn, graph, seen, version):
+    """Patch the crawl graph with the leaders written since leaders version `seen`"""
+    if seen[1] != version[1]:
+        # something was deleted
+        return None
+    for row in conn.execute('SELECT name, votes, naughty FROM leaders WHERE modified > ?', (seen[0],)):
+        if row['naughty'] == 0:
+            graph.set_leader(row['name'], row['votes'])
+        else:
+            graph.remove_leader(row['name'])
+    return graph
+
+
+_egg_snapshot = Snapshot(('names',), _load_egg_snapshot)
+_score_index = Snapshot(('names',), _load_score_index)
+_egg_graph = Snapshot(('leaders', 'leaders_deleted'), _load_egg_graph, refresh=_refresh_egg_graph)
+_leaderboard = Snapshot(('leaders',), _load_leaderboard)
+_weekly = Snapshot(('weekly', 'leaders'), _load_weekly)
+
+
+def _egg_state(row):
+    return row and (row['upvotes'] + row['downvotes'], is_bad_egg(row['upvotes'], row['downvotes']))
+
+
+def _egg_changed(old, new):
+    """Patch the score index with an egg going from row `old` to row `new`"""
+    if _score_index.loaded:
+        _score_index.value.update(_egg_state(old), _egg_state(new))
 
-            first_name = random.choice(conn.execute(
-                f'''
-                SELECT * FROM names
-                WHERE naughty=0
-                    AND NOT {BAD_EGG_CLAUSE}
-                    AND upvotes+downvotes > ?
-                    AND first_votes+?>=second_votes
-                ORDER BY {order}
-                LIMIT ?
-                ''',
-                (min_, ANNOTATE_THRESHOLD, limit)
-            ).fetchall())
-
-            log['first'] = {
-                'name': first_name['name'],
-                'upvotes': first_name['upvotes'],
-                'downvotes': first_name['downvotes'],
-                'first_votes': first_name['first_votes'],
-                'second_votes': first_name['second_votes'],
-                'order': order,
-                'min': min_,
-            }
-
-            order = 'RANDOM()'
-            limit = 1
-            min_ = -2
-            if random.random() < .05:
-                order = 'upvotes+downvotes AND RANDOM()'
-                limit = 200
-            if random.random() < 0.3:
-                min_ = lower
-            second_name = random.choice(conn.execute(
-                f'''
-                SELECT * FROM names
-                WHERE naughty=0
-                    AND NOT {BAD_EGG_CLAUSE}
-                    AND upvotes+downvotes > ?
-                    AND first_votes<=second_votes+?
-                    AND name != ?
-                ORDER BY {order}
-                LIMIT ?
-                ''',
-                (min_, ANNOTATE_THRESHOLD, first_name and first_name['name'], limit)
-            ).fetchall())
-
-            log['second'] = {
-                'name': second_name['name'],
-                'upvotes': second_name['upvotes'],
-                'downvotes': second_name['downvotes'],
-                'first_votes': second_name['first_votes'],
-                'second_votes': second_name['second_votes'],
-                'order': order,
-                'min': min_,
-            }
 
+def _leader_changed(row):
+    """Patch the crawl graph and leaderboard with a leader row read back after a write"""
+    if _egg_graph.loaded:
+        if row['naughty'] == 0:
+            _egg_graph.value.set_leader(row['name'], row['votes'])
+        else:
+            _egg_graph.value.remove_leader(row['name'])
+    if _leaderboard.loaded:
+        _leaderboard.value.update(row, row['naughty'] == 0 and row['votes'] > LEADER_THRESHOLD)
+
+
+def _weekly_changed(row, eligible):
+    if _weekly.loaded:
+        _weekly.value.update(row, eligible)
+
+
+def egg_score_percentile(p):
+    """Score of the p-th percentile (0-100) of non-bad eggs"""
+    with connect() as conn:
+        return _score_index.get(conn).percentile(p)
+
+
+def _egg_log(egg, fresh, min_):
+    return egg and {
+        'name': egg.name,
+        'score': egg.score,
+        'first_votes': egg.first_votes,
+        'second_votes': egg.second_votes,
+        'fresh': fresh,
+        'min': min_,
+    }
+
+
+def get_random_name():
+    _maybe_compact_weekly()
+    with connect() as conn, debug_log() as log:
+        if random.random() > .5:
+            log['mode'] = 'eggs'
+            eggs = _egg_snapshot.get(conn)
+            lower = _score_index.get(conn).median()
+            if lower is None:
+                lower = -2
+
+            fresh = random.random() < .05
+            min_ = lower if random.random() < 0.3 else -2
+            first_name = eggs.draw_first(min_, fresh=fresh)
+            log['first'] = _egg_log(first_name, fresh, min_)
+
+            fresh = random.random() < .05
+            min_ = lower if random.random() < 0.3 else -2
+            second_name = eggs.draw_second(min_, fresh=fresh, exclude=first_name and first_name.name)
+            log['second'] = _egg_log(second_name, fresh, min_)
+
+            name = None
             if first_name and second_name:
-                name = f'{first_name["name"]} {second_name["name"]}'
+                name = f'{first_name.name} {second_name.name}'
             else:
                 log['what'] = True
-                names = conn.execute(
-                    f'''
-                    SELECT * FROM names
-                    WHERE
-                        naughty=0 AND
-                        NOT {BAD_EGG_CLAUSE}
-                    ORDER BY RANDOM()
-                    LIMIT 2''').fetchall()
-                name = f'{names[0]["name"]} {names[1]["name"]}'
-
-            votes = conn.execute(f'SELECT * FROM leaders WHERE name = ? AND votes <= {LEADER_THRESHOLD} LIMIT 1', (name,))
-            if not votes.fetchone():
-                log['name'] = name
-                return name
+                names = eggs.draw_any(2)
+                if names:
+                    name = f'{names[0].name} {names[1].name}'
+
+            if name:
+                votes = conn.execute(f'SELECT * FROM leaders WHERE name = ? AND votes <= {LEADER_THRESHOLD} LIMIT 1', (name,))
+                if not votes.fetchone():
+                    log['name'] = name
+                    return name
             log['fallthrough_egg'] = True
 
         # no good name gen, just pick something good from the leaderboard
         if random.random() < .03:
             log['mode'] = 'weekly'
-            lookback = None or datetime.timedelta(days=7)
-            after = datetime.datetime.utcnow() - lookback
-            name = conn.execute(
-                '''
-                SELECT weekly.name as name
-                FROM weekly
-                JOIN leaders
-                    ON weekly.name = leaders.name
-                WHERE
-                    weekly.dt >= ? AND
-                    weekly.votes > 0 AND
-                    leaders.naughty = 0
-                ORDER BY RANDOM() LIMIT 1
-                ''',
-                (after,)
-            ).fetchone()
+            name = _weekly.get(conn).draw()
             if name:
-                log['name'] = name['name']
-                return name['name']
+                log['name'] = name
+                return name
             log['fallthrough_weekly'] = True
         """
         if random.random() < .1:
@@ -376,7 +1452,7 @@ def get_random_name():
             return random.choice(rows)['name']
         """
         log['mode'] = 'leaders'
-        name = conn.execute(f'SELECT * FROM leaders WHERE votes > {LEADER_THRESHOLD} AND naughty = 0 ORDER BY RANDOM() LIMIT 1').fetchone()
+        name = sample_rows(conn, 'leaders', f'votes > {LEADER_THRESHOLD} AND naughty = 0')[0]
         log['name'] = name['name']
         log['votes'] = name['votes']
         return name['name']
@@ -389,7 +1465,7 @@ def check_egg_threshold(fullname, c=None):
         SELECT * FROM names
         WHERE
             name IN ({",".join("?" * len(names))}) AND
-            NOT {BAD_EGG_CLAUSE}
+            is_bad = 0
         ''', names)
     if rows.fetchone():
         return True
@@ -410,37 +1486,116 @@ def get_mod_list():
 
 
 def moderate(names=None, eggs=None):
-    names = names or {}
-    eggs = eggs or {}
-    conn = connect()
-    with conn:
-        for id_, naughty in names.items():
-            conn.execute('UPDATE leaders SET naughty = ? WHERE id = ?', (naughty, id_))
-        for id_, naughty in eggs.items():
-            conn.execute('UPDATE names SET naughty = ? WHERE id = ?', (naughty, id_))
+    actions = {0: 'good', -1: 'bad', 1: 'pending'}
+    return moderate_bulk(
+        [('leaders', id_, actions[naughty]) for id_, naughty in (names or {}).items()] +
+        [('names', id_, actions[naughty]) for id_, naughty in (eggs or {}).items()]
+    )
 
 
+MODERATE_NAUGHTY = {'good': 0, 'bad': -1, 'pending': 1}
+MODERATE_SQL = {
+    ('leaders', 'reset'): 'UPDATE leaders SET votes=1 WHERE id=?',
+    ('names', 'reset'): 'UPDATE names SET upvotes=0, downvotes=0, first_votes=0, second_votes=0 WHERE id=?',
+    ('leaders', 'delete'): 'DELETE FROM leaders WHERE id=?',
+    ('names', 'delete'): 'DELETE FROM names WHERE id=?',
+}
+
+
+def moderate_bulk(actions):
+    """
+    Apply (table, id, action) triples in one transaction, one executemany per
+    kind of action. table is leaders or names; action is good, bad, pending,
+    reset or delete. Returns an outcome per triple, in order, with an error
+    for anything that wasn't applied.
+    """
+    results = []
+    todo = {}
+    with write(_score_index) as conn:
+        found = {}
+        for tbl in ('leaders', 'names'):
+            ids = list({int(id_) for t, id_, _ in actions if t == tbl and str(id_).isdigit()})
+            found[tbl] = {}
+            # chunked to stay under sqlite's bound parameter limit
+            for chunk in range(0, len(ids), 500):
+                batch = ids[chunk:chunk + 500]
+                cols = 'id, upvotes, downvotes' if tbl == 'names' else 'id'
+                found[tbl].update(
+                    (r['id'], r) for r in
+                    conn.execute(f'SELECT {cols} FROM {tbl} WHERE id IN ({",".join(["?"] * len(batch))})', batch)
+                )
+        for tbl, id_, action in actions:
+            res = {'table': tbl, 'id': id_, 'action': action, 'ok': False}
+            results.append(res)
+            if tbl not in found:
+                res['error'] = 'unknown table'
+            elif action not in MODERATE_NAUGHTY and (tbl, action) not in MODERATE_SQL:
+                res['error'] = 'unknown action'
+            elif not str(id_).isdigit() or int(id_) not in found[tbl]:
+                res['error'] = 'not found'
+            else:
+                res['ok'] = True
+                todo.setdefault((tbl, action), []).append(int(id_))
+        for (tbl, action), ids in todo.items():
+            if action in MODERATE_NAUGHTY:
+                conn.executemany(f'UPDATE {tbl} SET naughty = ? WHERE id = ?', [(MODERATE_NAUGHTY[action], i) for i in ids])
+            else:
+                conn.executemany(MODERATE_SQL[(tbl, action)], [(i,) for i in ids])
+            if tbl == 'names' and action in ('reset', 'delete'):
+                for i in set(ids):
+                    _egg_changed(found[tbl][i], {'upvotes': 0, 'downvotes': 0} if action == 'reset' else None)
+                    # an egg deleted twice in one batch only goes once
+                    found[tbl][i] = {'upvotes': 0, 'downvotes': 0}
+    return results
+
+
+def _search_ready(conn):
+    """The full text indexes hold every row, their backfills are done"""
+    return conn.execute("SELECT 1 FROM backfills WHERE name IN ('names_fts', 'leaders_fts') AND done = 0").fetchone() is None
+
 
 def purge(name):
     if not name:
         return
-    conn = connect()
-    with conn:
+    with write(_score_index) as conn:
         if isinstance(name, str):
-            conn.execute('DELETE FROM names WHERE name = ?', (name,))
-            conn.execute('DELETE FROM leaders WHERE name LIKE ?', (f'%{name}%',))
+            for old in conn.execute('DELETE FROM names WHERE name = ? RETURNING upvotes, downvotes', (name,)).fetchall():
+                _egg_changed(old, None)
+            if len(name) >= 3 and _search_ready(conn):
+                conn.execute(
+                    'DELETE FROM leaders WHERE id IN (SELECT rowid FROM leaders_fts WHERE leaders_fts MATCH ?)',
+                    ('"' + name.replace('"', '""') + '"',),
+                )
+            else:
+                conn.execute('DELETE FROM leaders WHERE name LIKE ?', (f'%{name}%',))
         else:
-            conn.execute('DELETE FROM names WHERE id = ?', (name,))
+            for old in conn.execute('DELETE FROM names WHERE id = ? RETURNING upvotes, downvotes', (name,)).fetchall():
+                _egg_changed(old, None)
             conn.execute('DELETE FROM leaders WHERE id = ?', (name,))
 
 
-def lookup(name, only_good=False, with_threshold=False):
+def lookup(name, only_good=False, with_threshold=False, limit=LOOKUP_LIMIT):
+    """
+    Eggs and full names containing `name`, best matches first. Uses the
+    trigram indexes; anything shorter than a trigram falls back to LIKE, as
+    does everything while the indexes are still being backfilled.
+    """
     if name in ('%', '_'):
         return {'names': [], 'eggs': []}
     conn = connect()
     with conn:
-        egg_query = 'SELECT * FROM names WHERE name LIKE ?'
-        name_query = 'SELECT * FROM leaders WHERE name LIKE ?'
+        if len(name) >= 3 and _search_ready(conn):
+            match = '"' + name.replace('"', '""') + '"'
+            egg_query = 'SELECT names.* FROM names_fts JOIN names ON names.id = names_fts.rowid WHERE names_fts MATCH ?'
+            name_query = 'SELECT leaders.* FROM leaders_fts JOIN leaders ON leaders.id = leaders_fts.rowid WHERE leaders_fts MATCH ?'
+            egg_order = 'ORDER BY names_fts.rank, names.name'
+            name_order = 'ORDER BY leaders_fts.rank, leaders.votes DESC'
+        else:
+            match = f'%{name}%'
+            egg_query = 'SELECT * FROM names WHERE name LIKE ?'
+            name_query = 'SELECT * FROM leaders WHERE name LIKE ?'
+            egg_order = 'ORDER BY name'
+            name_order = 'ORDER BY votes DESC'
         if only_good:
             egg_query += ' AND naughty = 0'
             name_query += ' AND naughty = 0'
@@ -448,11 +1603,11 @@ def lookup(name, only_good=False, with_threshold=False):
             name_query += f' AND votes > {LEADER_THRESHOLD}'
         res = {
             'eggs': [
-                dict(r) for r in conn.execute(egg_query, (f'%{name}%',))
-            ],
-            'names': [
-                dict(r) for r in conn.execute(name_query, (f'%{name}%',))
+                dict(r) for r in conn.execute(f'{egg_query} {egg_order} LIMIT ?', (match, limit))
             ],
+            'names': _with_pending([
+                dict(r) for r in conn.execute(f'{name_query} {name_order} LIMIT ?', (match, limit))
+            ]),
         }
     return res
 
@@ -464,8 +1619,11 @@ def mark_naughty(id_, is_leader=True, naughty=-1):
 
 
 def reset_egg(id_):
-    with connect() as conn:
-        conn.execute('UPDATE names SET upvotes=0, downvotes=0, first_votes=0, second_votes=0 WHERE id = ?', (id_, ))
+    with write(_score_index) as conn:
+        old = conn.execute('SELECT upvotes, downvotes FROM names WHERE id = ?', (id_,)).fetchone()
+        new = conn.execute('UPDATE names SET upvotes=0, downvotes=0, first_votes=0, second_votes=0 WHERE id = ? RETURNING upvotes, downvotes', (id_, )).fetchone()
+        if old:
+            _egg_changed(old, new)
 
 
 def reset_leader(id_):
@@ -473,7 +1631,6 @@ def reset_leader(id_):
         conn.execute('UPDATE leaders SET votes=1 WHERE id=?', (id_,))
 
 
-
 def admin_leaders():
     conn = connect()
     with conn:
@@ -484,8 +1641,9 @@ def admin_leaders():
 
 
 def delete_egg(id_):
-    with connect() as conn:
-        conn.execute('DELETE FROM names WHERE id=?', (id_, ))
+    with write(_score_index) as conn:
+        for old in conn.execute('DELETE FROM names WHERE id=? RETURNING upvotes, downvotes', (id_, )).fetchall():
+            _egg_changed(old, None)
 
 
 def delete_leader(id_):
@@ -502,16 +1660,21 @@ def admin_eggs():
 
 def random_pool(count=100):
     """Regard random pool of 100 names"""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    with conn:
-        names = conn.execute('SELECT name FROM leaders WHERE votes > 0 AND naughty = 0 ORDER BY RANDOM() LIMIT ?', (count,))
+    with connect() as conn:
+        names = sample_rows(conn, 'leaders', 'votes > 0 AND naughty = 0', k=count, columns='id, name')
         return [n['name'] for n in names]
 
 
 def flag_name(name, reason):
+    player = _new_players([name]).get(name, _NO_PLAYER)
     with connect() as conn:
-        conn.execute('INSERT INTO leaders (name, votes, naughty, flag, guid) VALUES (?, 0, 1, ?, ?) ON CONFLICT (name) DO UPDATE SET flag=?, naughty=1', (name, reason, str(uuid.uuid4()), reason))
+        conn.execute(
+            f'''
+            INSERT INTO leaders (name, votes, naughty, flag, guid, {_PLAYER_COLUMNS_SQL}) VALUES (?, 0, 1, ?, ?, {_PLAYER_VALUES_SQL})
+            ON CONFLICT (name) DO UPDATE SET flag=?, naughty=1, {_PLAYER_FILL_SQL}
+            ''',
+            (name, reason, str(uuid.uuid4()), *player, reason),
+        )
 
 
 def flag_egg(name, reason):
@@ -521,7 +1684,7 @@ def flag_egg(name, reason):
 
 def collect(friends=14, threshold=1):
     with connect() as conn:
-        res = conn.execute('SELECT * FROM leaders WHERE naughty = 0 AND votes >= ? ORDER BY RANDOM() LIMIT ?', (threshold, friends))
+        res = sample_rows(conn, 'leaders', 'naughty = 0 AND votes >= ?', (threshold,), friends, 'id, name')
         return [r['name'] for r in res]
 
 
@@ -550,7 +1713,7 @@ def get_names_from_guids(guids):
 
 def get_guid_for_name(name):
     with connect() as conn:
-        row = conn.execute('SELECT guid FROM leaders WHERE name=?', (name,)).fetchone()['guid']
+        row = conn.execute('SELECT guid FROM leaders WHERE name=?', (name,)).fetchone()
         return row and row['guid']
 
 
@@ -560,231 +1723,388 @@ def get_name_from_guid(guid):
         return c.execute('SELECT name FROM leaders WHERE guid=?', (guid,)).fetchone()['name']
 
 
-def dump_names():
+def get_player_stats(names, version):
+    """name -> cached stats of whichever of `names` were generated by `version`"""
+    res = {}
     with connect() as conn:
-        return [dict(r) for r in conn.execute('SELECT * FROM names')]
+        # chunked to stay under sqlite's bound parameter limit
+        for chunk in range(0, len(names), 500):
+            batch = names[chunk:chunk + 500]
+            rows = conn.execute(
+                f'SELECT name, stats FROM player_stats WHERE name IN ({",".join(["?"] * len(batch))}) AND version = ?',
+                (*batch, version),
+            )
+            res.update((r['name'], json.loads(r['stats'])) for r in rows)
+    return res
 
 
-def dump_leaders():
+def save_player_stats(stats, version):
+    """
+    Cache name -> stats, for names on the leaders table only. Anything else
+    anyone asks about is made again next time rather than kept forever, and
+    doesn't cost a write.
+    """
+    names = list(stats)
+    known = set()
     with connect() as conn:
-        return [dict(r) for r in conn.execute('SELECT * FROM leaders')]
+        for chunk in range(0, len(names), 500):
+            batch = names[chunk:chunk + 500]
+            known.update(r['name'] for r in conn.execute(f'SELECT name FROM leaders WHERE name IN ({",".join(["?"] * len(batch))})', batch))
+    if not known:
+        return
+    with write() as conn:
+        conn.executemany(
+            '''
+            INSERT INTO player_stats (name, version, stats) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET version = excluded.version, stats = excluded.stats
+            ''',
+            [(name, version, json.dumps(js)) for name, js in stats.items() if name in known],
+        )
+
+
+def iter_rows(table, since_id=0, chunk=DUMP_CHUNK):
+    """
+    Every row of `table` with an id past `since_id`, in id order, fetched
+    `chunk` rows at a time so only one chunk is ever held.
+    """
+    while True:
+        with connect() as conn:
+            rows = conn.execute(f'SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?', (since_id, chunk)).fetchall()
+        for r in rows:
+            yield dict(r)
+        if len(rows) < chunk:
+            return
+        since_id = rows[-1]['id']
+
+
+def dump_names(since_id=0):
+    return iter_rows('names', since_id)
+
+
+def dump_leaders(since_id=0):
+    return iter_rows('leaders', since_id)
 
 
 def chart_leaders():
-    with connect() as conn:
-        res = conn.execute('SELECT count(*) as c, votes FROM leaders GROUP BY votes ORDER BY votes').fetchall()
-        return [r['c'] for r in res], [r['votes'] for r in res]
+    return _histogram('leader_votes')
+
+
+def _chart_epoch():
+    return int(time.monotonic() // CHART_TTL)
+
+
+def _egg_range(conn, start, end):
+    if not end:
+        end = conn.execute('SELECT MAX(id) as m FROM names').fetchone()['m']
+    return start, end
+
+
+def chart_eggs(start=1, end=None, budget=CHART_POINTS):
+    """Good and bad egg scores by id, downsampled to about `budget` points"""
+    return _chart_eggs(start, end, budget, _chart_epoch())
 
 
-def chart_eggs(start=1, end=None):
+@functools.lru_cache(64)
+def _chart_eggs(start, end, budget, epoch):
     with connect() as conn:
-        if not end:
-            end = conn.execute('SELECT MAX(id) as m FROM names').fetchone()['m']
-        good = conn.execute(
-            f'''
-            SELECT
-                id as x,
-                upvotes+downvotes as y
-            FROM names
-            WHERE
-                naughty=0 AND
-                id>=? AND id<=? AND
-                NOT {BAD_EGG_CLAUSE}
-            ORDER BY id
-            ''',
-            (start, end,))
-        bad = conn.execute(
-            f'''
+        rows = conn.execute(
+            '''
             SELECT
                 id as x,
-                upvotes+downvotes as y
+                score as y,
+                is_bad
             FROM names
             WHERE
                 naughty=0 AND
-                id>=? AND
-                id<=? AND
-                {BAD_EGG_CLAUSE}
+                id>=? AND id<=?
             ORDER BY id
             ''',
-            (start, end,))
-        return good, bad
+            _egg_range(conn, start, end),
+        ).fetchall()
+    good = [r for r in rows if not r['is_bad']]
+    bad = [r for r in rows if r['is_bad']]
+    res = []
+    for eggs in (good, bad):
+        # split the budget by how many points each series has
+        share = max(3, round(budget * len(eggs) / max(len(rows), 1)))
+        xs = [r['x'] for r in eggs]
+        ys = [r['y'] for r in eggs]
+        res.append([{'x': xs[i], 'y': ys[i]} for i in lttb(xs, ys, share)])
+    return tuple(res)
+
 
+def chart_egg_votes(start=1, end=None, budget=CHART_POINTS):
+    """Up and downvotes by egg id, downsampled to about `budget` eggs"""
+    return _chart_egg_votes(start, end, budget, _chart_epoch())
 
-def chart_egg_votes(start=1, end=None):
+
+@functools.lru_cache(64)
+def _chart_egg_votes(start, end, budget, epoch):
     with connect() as conn:
-        if not end:
-            end = conn.execute('SELECT MAX(id) as m FROM names').fetchone()['m']
-        return conn.execute(
+        rows = conn.execute(
             'SELECT id, upvotes, downvotes FROM names WHERE naughty=0 AND id>=? AND id<=? ORDER BY id',
-            (start, end),
+            _egg_range(conn, start, end),
         ).fetchall()
+    # keep the eggs that shape the total number of votes
+    picked = lttb([r['id'] for r in rows], [r['upvotes'] - r['downvotes'] for r in rows], budget)
+    return [dict(rows[i]) for i in picked]
 
 
 def chart_annotations():
-    with connect() as conn:
-        res = conn.execute('SELECT count(*) as c, first_votes-second_votes as diff FROM names GROUP BY diff ORDER BY diff').fetchall()
-        return [r['c'] for r in res], [r['diff'] for r in res]
+    return _histogram('egg_annotations')
 
 
-def get_names(threshold=0, limit=100, offset=0, rand=0):
+def _names_filter(threshold, mins):
+    """
+    Index hint, where sql and params shared by get_names and get_names_page.
+    `mins` is PLAYER_COLUMNS -> lowest allowed value. Without stats the
+    planner would rather walk the votes index, but a few stars narrow it
+    down much more than votes do.
+    """
+    mins = mins or {}
+    for col in mins:
+        if col not in PLAYER_COLUMNS:
+            raise ValueError(f'unknown player stat `{col}`')
+    hint = f'INDEXED BY idx_leaders_{next(iter(mins))}' if mins else ''
+    where = 'naughty=0 AND votes>=?' + ''.join(f' AND {col}>=?' for col in mins)
+    return hint, where, (threshold, *mins.values())
+
+
+def get_names(threshold=0, limit=100, offset=0, rand=0, mins=None):
+    """Good names with at least `threshold` votes and the player stats in `mins`"""
+    hint, where, params = _names_filter(threshold, mins)
     with connect() as c:
-        order = 'RANDOM()' if rand else 'name'
+        if rand:
+            return [n['name'] for n in sample_rows(c, 'leaders', where, params, limit, 'id, name')]
         return [
             n['name'] for n in c.execute(
-                f'SELECT * FROM leaders WHERE naughty=0 AND votes>=? ORDER BY {order} LIMIT ?,?',
-                (threshold, offset, limit),
+                f'SELECT * FROM leaders {hint} WHERE {where} ORDER BY name LIMIT ?,?',
+                (*params, offset, limit),
             )
         ]
 
 
+def encode_cursor(row):
+    """Opaque page token pointing just past `row`"""
+    return base64.urlsafe_b64encode(json.dumps([row['name'], row['id']]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(name, id) from a page token, (None, None) for the first page; ValueError if it's junk"""
+    if not cursor:
+        return None, None
+    try:
+        name, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f'bad cursor `{cursor}`')
+    if not isinstance(name, str) or not isinstance(id_, int):
+        raise ValueError(f'bad cursor `{cursor}`')
+    return name, id_
+
+
+def _page(rows, limit):
+    # names are unique, so pages sort by name alone and id just rides along in the token
+    return {
+        'data': [r['name'] for r in rows],
+        'next': encode_cursor(rows[-1]) if len(rows) == limit and rows else None,
+    }
+
+
+def get_names_page(threshold=0, limit=100, cursor=None, mins=None):
+    """A page of get_names in name order, starting after `cursor`"""
+    name, id_ = decode_cursor(cursor)
+    hint, where, params = _names_filter(threshold, mins)
+    with connect() as c:
+        rows = c.execute(
+            f'SELECT id, name FROM leaders {hint} WHERE {where} AND (name, id) > (?, ?) ORDER BY name LIMIT ?',
+            (*params, name or '', id_ or 0, limit),
+        ).fetchall()
+    return _page(rows, limit)
+
+
 def crawl_names(likeness, threshold=0, fanout=2, limit=100):
-    '''
-    welcome to tablescan city
-    '''
-    first, second = likeness.split(' ')
-    fanout = max(1, min(fanout, 10))
-    gensize = max(1, int(limit / fanout))
-    def likegen(firsts, seconds):
-        eggs = [f'{f} %' for f in firsts] + [f'% {s}' for s in seconds]
-        likes = f'({" OR ".join(["name LIKE ?"] * len(eggs))})'
-        return likes, eggs
+    """
+    names sharing a first or last egg, and names sharing theirs...
+    """
     with connect() as c:
-        firsts = {first}
-        seconds = {second}
-        names = {likeness}
-        for _ in range(fanout):
-            lc, e = likegen(firsts, seconds)
-            q = f'''
-                SELECT * FROM leaders
-                WHERE
-                    naughty=0 AND 
-                    votes >= ? AND
-                    {lc}
-                ORDER BY RANDOM()
-                LIMIT ?
-            '''
-            rows = c.execute(q, [threshold] + e + [gensize])
-            names = names | set([r['name'] for r in rows])
-            firsts = set([n.split(' ')[0] for n in names])
-            seconds = {n.split(' ')[-1] for n in names}
-    return sorted(list(names), key=lambda _: random.random())[:limit]
+        return _egg_graph.get(c).crawl_names(likeness, threshold, fanout, limit)
 
 
 def crawl_eggs(likenesses, threshold=0, fanout=3, limit=10, egg_threshold=0):
     """
-    it's tablescan city (the remix)
+    names made of any of these eggs, then names made of their eggs, as long
+    as those are good eggs scoring at least `egg_threshold`...
     """
-    fanout = max(1, min(fanout, 10))
-    gensize = max(int(limit / fanout), 10)
-    def likegen(eggs):
-        return f'({" OR ".join(["name LIKE ?"] * len(eggs))})', [f'%{e}%' for e in eggs]
     with connect() as c:
-        eggs = set(likenesses)
-        names = set()
-        for _ in range(fanout):
-            eq = f'''
-                SELECT name FROM names
-                WHERE
-                    naughty=0 AND
-                    NOT {BAD_EGG_CLAUSE} AND
-                    upvotes+downvotes > ? AND
-                    name IN ({",".join(["?"] * len(eggs))})
-            '''
-            eggrows = c.execute(eq, [egg_threshold] + list(eggs))
-            eggs = eggs | set((r['name'] for r in eggrows))
-            if len(eggs) == 0:
-                break
-
-            lc, e = likegen(eggs)
-            q = f'''
-                SELECT name FROM leaders
-                WHERE
-                    naughty=0 AND
-                    votes >= ? AND
-                    {lc}
-                ORDER BY RANDOM()
-                LIMIT ?
-            '''
-            rows = c.execute(q, [threshold] + e + [gensize])
-            names = names | set([r['name'] for r in rows])
-            eggs = eggs | set(sum((n.split(' ') for n in names), []))
-    return sorted(list(names), key=lambda _: random.random())[:limit]
+        graph = _egg_graph.get(c)
+        eggs = _egg_snapshot.get(c)
+    def egg_ok(egg):
+        score = eggs.good_score(egg)
+        return score is not None and score >= egg_threshold
+    return graph.crawl_eggs(likenesses, threshold, fanout, limit, egg_ok)
+
+
+def _eggs_filter(threshold, first, second, affinity):
+    """Where sql and params shared by get_eggs and get_eggs_page"""
+    if affinity < 0:
+        affinity_clause = 'first_votes / NULLIF(first_votes + second_votes, 0) >= -1 * '
+    elif affinity > 0:
+        affinity_clause = 'second_votes / NULLIF(first_votes + second_votes, 0) >='
+    else:
+        affinity_clause = '1 >'
+    where = f'''
+        naughty=0 AND
+        is_bad=0
+        AND score > ?
+        AND first_votes >= ?
+        AND second_votes >= ?
+        AND {affinity_clause} ?
+    '''
+    return where, (threshold, first, second, affinity)
 
 
 def get_eggs(threshold=0, limit=100, offset=0, rand=0, first=float('-inf'), second=float('-inf'), affinity=0):
+    where, params = _eggs_filter(threshold, first, second, affinity)
     with connect() as c:
-        order = 'RANDOM()' if rand else 'name'
-        affinity_clause = ''
-        if affinity < 0:
-            affinity_clause = 'first_votes / NULLIF(first_votes + second_votes, 0) >= -1 * '
-        elif affinity > 0:
-            affinity_clause = 'second_votes / NULLIF(first_votes + second_votes, 0) >='
-        else:
-            affinity_clause = '1 >'
+        if rand:
+            rows = sample_rows(c, 'names', where, params, limit, 'id, name')
+            return [n['name'] for n in rows]
         return [
             n['name'] for n in c.execute(
-                f'''
-                    SELECT * FROM names
-                    WHERE
-                        naughty=0 AND
-                        NOT {BAD_EGG_CLAUSE}
-                        AND upvotes+downvotes > ?
-                        AND first_votes >= ?
-                        AND second_votes >= ?
-                        AND {affinity_clause} ?
-                    ORDER BY {order} LIMIT ?,?
-                ''',
-                (threshold, first, second, affinity, offset, limit),
+                f'SELECT * FROM names WHERE {where} ORDER BY name LIMIT ?,?',
+                (*params, offset, limit),
             )
         ]
 
 
+def get_eggs_page(threshold=0, limit=100, cursor=None, first=float('-inf'), second=float('-inf'), affinity=0):
+    """A page of get_eggs in name order, starting after `cursor`"""
+    name, id_ = decode_cursor(cursor)
+    where, params = _eggs_filter(threshold, first, second, affinity)
+    with connect() as c:
+        rows = c.execute(
+            f'SELECT id, name FROM names WHERE {where} AND (name, id) > (?, ?) ORDER BY name LIMIT ?',
+            (*params, name or '', id_ or 0, limit),
+        ).fetchall()
+    return _page(rows, limit)
+
+
 def annotate_egg(egg, first=0, second=0, both=False):
     with connect() as c:
-        if both:
-            res = c.execute('SELECT * FROM names WHERE name=?', (egg,)).fetchone()
-            avg = (res['first_votes'] + res['second_votes']) / 2
-            first = -1 if res['first_votes'] > avg else 1
-            second = -1 if res['second_votes'] > avg else 1
-        c.execute('UPDATE names SET first_votes=first_votes+?, second_votes=second_votes+? WHERE name=?', (first, second, egg))
+        _annotate(c, egg, first, second, both)
+
+
+def _annotate(c, egg, first=0, second=0, both=False):
+    """
+    Shift an egg's first/second votes. With `both`, whichever side is ahead of
+    the average goes down one and the other goes up one.
+    """
+    if both:
+        c.execute(
+            '''
+            UPDATE names
+            SET
+                first_votes = first_votes + (CASE WHEN first_votes > (first_votes + second_votes) / 2.0 THEN -1 ELSE 1 END),
+                second_votes = second_votes + (CASE WHEN second_votes > (first_votes + second_votes) / 2.0 THEN -1 ELSE 1 END)
+            WHERE name = ?
+            ''',
+            (egg,),
+        )
+        return
+    c.execute('UPDATE names SET first_votes=first_votes+?, second_votes=second_votes+? WHERE name=?', (first, second, egg))
+
+
+Judgement = namedtuple('Judgement', ['thumbs', 'flipped_thumbs', 'hit_eggs', 'annotate'])
+
+JUDGEMENTS = {
+    # appraising a full name
+    'love': Judgement(2, 0, True, 'pair'),
+    'up': Judgement(1, 0, True, None),
+    'hate': Judgement(-2, -2, True, None),
+    'down': Judgement(-1, -1, True, None),
+    # annotating an egg
+    'left': Judgement(0, 0, True, 'first'),
+    'right': Judgement(0, 0, True, 'second'),
+    'both': Judgement(0, 0, True, 'both'),
+    'fade': Judgement(-1, 0, True, None),
+    # from the leaderboard
+    'sink': Judgement(-1, 0, False, None),
+    'flip': Judgement(0, 0, False, 'flip'),
+}
+
+
+def apply_judgement(name, judgement, reverse=False):
+    """
+    Everything one rating / annotation / leaderboard action does, in a single
+    transaction. `reverse` is an upvote on a name shown flipped, which also
+    notes each egg's position.
+    """
+    j = JUDGEMENTS[judgement]
+    if judgement == 'up' and reverse:
+        j = j._replace(annotate='pair')
+    eggs = split_full_name(name)
+    votes = []
+    if j.thumbs:
+        votes.append((' '.join(eggs), j.thumbs, j.hit_eggs))
+    if j.flipped_thumbs:
+        votes.append((' '.join(eggs[::-1]), j.flipped_thumbs, False))
+    if judgement == 'down':
+        # the flipped name goes first, before this vote can change its eggs' standing
+        votes.reverse()
+    if WRITE_BEHIND:
+        for vote in votes:
+            _vote_buffer.add(*vote)
+        votes = []
+    if not votes and not j.annotate:
+        return
+
+    players = _new_players([n for n, _, _ in votes] + ([_flipped(name)] if j.annotate == 'flip' else []))
+    with write(_score_index, _egg_graph, _leaderboard, _weekly) as conn:
+        for n, thumbs, hit_eggs in votes:
+            _upvote(conn, n, VoteDelta.of(thumbs, hit_eggs), players.get(n))
+        if j.annotate == 'pair':
+            conn.execute(
+                '''
+                UPDATE names
+                SET first_votes = first_votes + (name = ?), second_votes = second_votes + (name = ?)
+                WHERE name IN (?, ?)
+                ''',
+                (eggs[0], eggs[-1], eggs[0], eggs[-1]),
+            )
+        elif j.annotate == 'first':
+            _annotate(conn, name, first=2)
+        elif j.annotate == 'second':
+            _annotate(conn, name, second=2)
+        elif j.annotate == 'both':
+            _annotate(conn, name, both=True)
+        elif j.annotate == 'flip':
+            _flip(conn, name, players)
 
 
 def get_annotate_examples(egg, limit=5, rand=0):
     order = 'RANDOM()' if rand else 'votes DESC'
     with connect() as c:
         as_first = c.execute(
-            f'SELECT * FROM leaders WHERE name LIKE ? AND votes > ? AND naughty=0 ORDER BY {order} LIMIT ?',
-            (f'{egg} %', LEADER_THRESHOLD, limit),
+            f'SELECT * FROM leaders WHERE first_egg_id = (SELECT id FROM names WHERE name = ?) AND votes > ? AND naughty=0 ORDER BY {order} LIMIT ?',
+            (egg, LEADER_THRESHOLD, limit),
         ).fetchall()
         if len(as_first) < limit:
             rem = limit - len(as_first)
-            as_first.extend([{'name': f'{egg} {r["name"]}'} for r in c.execute(
-                f'''
-                SELECT * FROM names
-                WHERE
-                    naughty=0
-                    AND NOT {BAD_EGG_CLAUSE}
-                ORDER BY RANDOM()
-                LIMIT ?''',
-                (rem,),
-            )])
+            as_first.extend([
+                {'name': f'{egg} {r["name"]}'}
+                for r in sample_rows(c, 'names', 'naughty=0 AND is_bad=0', k=rem, columns='id, name')
+            ])
 
         as_second = c.execute(
-            f'SELECT * FROM leaders WHERE name LIKE ? AND votes > ? AND naughty=0 ORDER BY {order} LIMIT ?',
-            (f'% {egg}', LEADER_THRESHOLD, limit),
+            f'SELECT * FROM leaders WHERE second_egg_id = (SELECT id FROM names WHERE name = ?) AND votes > ? AND naughty=0 ORDER BY {order} LIMIT ?',
+            (egg, LEADER_THRESHOLD, limit),
         ).fetchall()
         if len(as_second) < limit:
             rem = limit - len(as_second)
-            as_second.extend([{'name': f'{r["name"]} {egg}'} for r in c.execute(
-                f'''
-                SELECT * FROM names
-                WHERE
-                    naughty=0 AND
-                    NOT {BAD_EGG_CLAUSE}
-                ORDER BY RANDOM()
-                LIMIT ?''',
-                (rem,),
-            )])
+            as_second.extend([
+                {'name': f'{r["name"]} {egg}'}
+                for r in sample_rows(c, 'names', 'naughty=0 AND is_bad=0', k=rem, columns='id, name')
+            ])
 
     return {
         'as_first': as_first,
@@ -807,10 +2127,15 @@ def share_guid(name):
                 is_naughty = 0
         if is_naughty == 1:
             return ''  # probably garbage, don't pollute DB
-        c.execute(
-            'INSERT INTO leaders (name, votes, naughty, guid) VALUES (?, 0, ?, ?) ON CONFLICT (name) DO UPDATE SET votes=votes',
-            (name, is_naughty, guid))
-        return guid
+        # nothing is locked yet, the insert below is what takes the write lock
+        player = _new_players([name]).get(name, _NO_PLAYER)
+        return c.execute(
+            f'''
+            INSERT INTO leaders (name, votes, naughty, guid, {_PLAYER_COLUMNS_SQL}) VALUES (?, 0, ?, ?, {_PLAYER_VALUES_SQL})
+            ON CONFLICT (name) DO UPDATE SET votes=votes
+            RETURNING guid
+            ''',
+            (name, is_naughty, guid, *player)).fetchone()['guid']
 
 
 @functools.lru_cache(1024)
@@ -888,9 +2213,7 @@ def get_collection_image_url(*names, **kwargs):
 
 
 def load():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    # TODO load from csv of existing blaseballers
+    """Seed a hardcoded list of eggs; `import` takes a file of them"""
     names = [
         'York',
         'Silk',
@@ -948,28 +2271,152 @@ def load():
         'J.\xa0Reily',
         'de\xa0Vito',
     ]
-    with conn:
-        for name in names:
-            try:
-                conn.execute('INSERT INTO names (name, guid) VALUES (?, ?)', (name, str(uuid.uuid4())))
-            except Exception:
-                pass
+    import_rows({'name': name, 'kind': 'egg'} for name in names)
 
 
-def backfill_guids():
-    with connect() as c:
-        rows = c.execute('SELECT id FROM leaders WHERE guid IS NULL').fetchall()
-        for row in rows:
-            c.execute('UPDATE leaders SET guid=? WHERE id=?', (str(uuid.uuid4()), row['id'],))
-        rows = c.execute('SELECT id FROM names WHERE guid IS NULL').fetchall()
-        for row in rows:
-            c.execute('UPDATE names SET guid=? WHERE id=?', (str(uuid.uuid4()), row['id'],))
+def read_import(path):
+    """
+    Rows of a CSV (with a `name` column, and optionally `kind`) or NDJSON
+    (objects with `name`/`kind`, or bare strings) file, one at a time.
+    `kind` is egg or name; without it anything with a space is a full name.
+    """
+    f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield {'name': row} if isinstance(row, str) else row
+        else:
+            yield from csv.DictReader(f)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
 
+def import_rows(rows, batch_size=IMPORT_BATCH, progress=None):
+    """
+    Insert eggs and full names from `rows` ({'name', 'kind'} dicts) in one
+    transaction, `batch_size` rows per statement. Names go through the same
+    checks as submissions; anything already there is left alone. Returns
+    counts of what happened.
+
+    The row triggers on names and leaders are dropped for the load and put
+    back before it commits, see _bulk_recount. New names' player columns are
+    left to the leaders_player backfill, see run_backfills.
+    """
+    stats = {'rows': 0, 'eggs': 0, 'names': 0, 'rejected': 0}
+    eggs, leaders = {}, {}
+    # checked before the write lock is taken
+    for row in rows:
+        stats['rows'] += 1
+        try:
+            name = process_name(row.get('name'))
+        except ValueError:
+            stats['rejected'] += 1
+            continue
+        kind = row.get('kind') or ('name' if ' ' in name else 'egg')
+        if kind == 'egg':
+            eggs[egg_name(name)] = True
+        elif kind == 'name':
+            parts = split_full_name(name)
+            for e in parts:
+                eggs[e] = True
+            leaders[' '.join(parts)] = True
+        else:
+            stats['rejected'] += 1
+        if progress and stats['rows'] % batch_size == 0:
+            progress(stats)
+    # in name order, the unique name indexes take them faster
+    eggs, leaders = sorted(eggs), sorted(leaders)
+
+    with write() as conn:
+        last_ids = {
+            tbl: conn.execute(f'SELECT COALESCE(MAX(id), 0) AS m FROM {tbl}').fetchone()['m']
+            for tbl in ('names', 'leaders')
+        }
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('names', 'leaders')"
+        ).fetchall()
+        for trigger in triggers:
+            conn.execute(f'DROP TRIGGER {trigger["name"]}')
+        for chunk in range(0, len(eggs), batch_size):
+            stats['eggs'] += conn.executemany(
+                f'INSERT INTO names (name, guid) VALUES (?, {UUID_SQL}) ON CONFLICT (name) DO NOTHING',
+                [(e,) for e in eggs[chunk:chunk + batch_size]],
+            ).rowcount
+            if progress:
+                progress(stats)
+        for chunk in range(0, len(leaders), batch_size):
+            # eggs go in first so the egg ids are there to set up front
+            stats['names'] += conn.executemany(
+                f'''
+                INSERT INTO leaders (name, votes, naughty, guid, first_egg_id, second_egg_id)
+                VALUES (?, 1, 0, {UUID_SQL}, (SELECT id FROM names WHERE name = ?), (SELECT id FROM names WHERE name = ?))
+                ON CONFLICT (name) DO NOTHING
+                ''',
+                [(n, *split_name(n)) for n in leaders[chunk:chunk + batch_size]],
+            ).rowcount
+            if progress:
+                progress(stats)
+        for tbl, last_id in last_ids.items():
+            _bulk_recount(conn, tbl, last_id)
+        for trigger in triggers:
+            conn.execute(trigger['sql'])
+        if stats['names']:
+            _schedule_backfill(conn, 'leaders_player', after=last_ids['leaders'])
+    return stats
+
+
+def _bulk_recount(conn, tbl, last_id):
+    """
+    What the insert triggers on `tbl` would have done for each row after
+    `last_id`, done once over all of them. Keep in step with those triggers.
+    """
+    end = conn.execute(f'SELECT MAX(id) AS m FROM {tbl}').fetchone()['m']
+    if end is None or end <= last_id:
+        return
+    if tbl == 'names':
+        conn.execute(BACKFILLS['egg_scores'][1], (last_id, end))
+    conn.execute(_fts_backfill_sql(tbl), (last_id, end))
+    for kind, (table, _, bucket) in HISTOGRAMS.items():
+        if table != tbl:
+            continue
+        conn.execute(
+            f'''
+            INSERT INTO histograms (kind, bucket, count)
+                SELECT ?, {bucket.format(row=tbl)} AS b, count(*) FROM {tbl}
+                WHERE id > ? AND b IS NOT NULL
+                GROUP BY b
+            ON CONFLICT (kind, bucket)
+                DO UPDATE SET count = count + excluded.count
+            ''',
+            (kind, last_id),
+        )
+    # one bump for the lot, rather than one per row
+    conn.execute('UPDATE versions SET version = version + 1 WHERE tbl = ?', (tbl,))
+    if tbl == 'leaders':
+        conn.execute("UPDATE leaders SET modified = (SELECT version FROM versions WHERE tbl = 'leaders') WHERE id > ?", (last_id,))
+
+
+def _import_progress(start):
+    def progress(stats):
+        rate = stats['rows'] / max(time.monotonic() - start, 1e-6)
+        print(
+            f"\r{stats['rows']} rows, {stats['eggs']} eggs, {stats['names']} names, "
+            f"{stats['rejected']} rejected ({rate:.0f} rows/s)",
+            end='', file=sys.stderr, flush=True,
+        )
+    return progress
 
 
 if __name__ == '__main__':
     if len(sys.argv) == 3 and sys.argv[1] == 'purge':
         purge(sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'import':
+        import_rows(read_import(sys.argv[2]), progress=_import_progress(time.monotonic()))
+        print(file=sys.stderr)
+        run_backfills()
     elif len(sys.argv) == 3 and sys.argv[1] == 'img':
         print(get_collection_image_url(*sys.argv[2].split(',')))
     else:
@@ -982,3 +2429,5 @@ if __name__ == '__main__':
                 load()
             if arg == 'migrate':
                 migrate()
+            if arg == 'compact':
+                print(f'compacted {compact_weekly()} names')
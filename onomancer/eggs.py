@@ -0,0 +1,249 @@
+"""
+In-memory views over the names (eggs) table.
+
+Nothing in here talks to the database; database.py builds these from rows and
+decides when they are stale.
+"""
+import bisect
+import random
+import threading
+from array import array
+from collections import namedtuple
+
+Egg = namedtuple('Egg', ['id', 'name', 'score', 'first_votes', 'second_votes', 'naughty'])
+
+FRESH_LIMIT = 200
+
+
+def is_bad_egg(upvotes, downvotes):
+    """Python twin of database.BAD_EGG_CLAUSE"""
+    return (
+        (upvotes - downvotes > 15 and (upvotes == 0 or -1.0 * downvotes / upvotes > 0.5))
+        or (downvotes <= -4 and upvotes + downvotes <= -2)
+    )
+
+
+class EggSnapshot:
+    """
+    Every egg that isn't a bad egg, held in compact arrays sorted by (score, id).
+
+    Answers the get_random_name draws without touching sqlite: "first" and
+    "second" draws are a bisect on score plus a random index.
+    """
+
+    def __init__(self, rows, annotate_threshold):
+        # rows must come in sorted by (score, id)
+        self.names = []
+        self.ids = array('q')
+        self.scores = array('q')
+        self.first_votes = array('q')
+        self.second_votes = array('q')
+        self.naughty = array('b')
+        for r in rows:
+            self.names.append(r['name'])
+            self.ids.append(r['id'])
+            self.scores.append(r['score'])
+            self.first_votes.append(r['first_votes'])
+            self.second_votes.append(r['second_votes'])
+            self.naughty.append(r['naughty'])
+
+        # positions (into the arrays above) of good eggs that can lead or trail a name
+        self.firsts = array('q')
+        self.seconds = array('q')
+        for i in range(len(self.ids)):
+            if self.naughty[i] != 0:
+                continue
+            if self.first_votes[i] + annotate_threshold >= self.second_votes[i]:
+                self.firsts.append(i)
+            if self.first_votes[i] <= self.second_votes[i] + annotate_threshold:
+                self.seconds.append(i)
+        self.good = array('q', (i for i in range(len(self.ids)) if self.naughty[i] == 0))
+        self._first_scores = array('q', (self.scores[i] for i in self.firsts))
+        self._second_scores = array('q', (self.scores[i] for i in self.seconds))
+        self._firsts_by_id = sorted(self.firsts, key=self.ids.__getitem__)
+        self._seconds_by_id = sorted(self.seconds, key=self.ids.__getitem__)
+        self._by_name = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def egg(self, i):
+        return Egg(
+            self.ids[i],
+            self.names[i],
+            self.scores[i],
+            self.first_votes[i],
+            self.second_votes[i],
+            self.naughty[i],
+        )
+
+    def good_score(self, name):
+        """Score of a good (not naughty, not bad) egg, None for anything else"""
+        i = self._by_name.get(name)
+        if i is None or self.naughty[i] != 0:
+            return None
+        return self.scores[i]
+
+    def draw_first(self, min_score, fresh=False):
+        return self._draw(self.firsts, self._first_scores, self._firsts_by_id, min_score, fresh)
+
+    def draw_second(self, min_score, fresh=False, exclude=None):
+        return self._draw(self.seconds, self._second_scores, self._seconds_by_id, min_score, fresh, exclude)
+
+    def draw_any(self, k=2):
+        if len(self.good) < k:
+            return []
+        return [self.egg(i) for i in random.sample(self.good, k)]
+
+    def _draw(self, positions, scores, by_id, min_score, fresh, exclude=None):
+        lo = bisect.bisect_right(scores, min_score)
+        if fresh:
+            candidates = [
+                i for i in self._fresh(positions, scores, by_id, min_score)
+                if self.names[i] != exclude
+            ]
+            return self.egg(random.choice(candidates)) if candidates else None
+
+        n = len(positions) - lo
+        for _ in range(8):
+            if n <= 0:
+                return None
+            i = positions[lo + random.randrange(n)]
+            if self.names[i] != exclude:
+                return self.egg(i)
+        # the only candidate left is the excluded egg
+        rest = [i for i in positions[lo:] if self.names[i] != exclude]
+        return self.egg(random.choice(rest)) if rest else None
+
+    def _fresh(self, positions, scores, by_id, min_score):
+        """
+        The old `ORDER BY upvotes+downvotes AND RANDOM() LIMIT 200`: eggs with a
+        zero score sort first (by id), then everything else by id.
+        """
+        picked = []
+        if min_score < 0:
+            zlo = bisect.bisect_left(scores, 0)
+            zhi = bisect.bisect_right(scores, 0)
+            picked = list(positions[zlo:zhi][:FRESH_LIMIT])
+        if len(picked) < FRESH_LIMIT:
+            for i in by_id:
+                s = self.scores[i]
+                if s <= min_score or s == 0:
+                    continue
+                picked.append(i)
+                if len(picked) >= FRESH_LIMIT:
+                    break
+        return picked
+
+
+class ScoreIndex:
+    """
+    Order statistics over the scores (upvotes+downvotes) of non-bad eggs.
+
+    A Fenwick tree of counts over [lo, hi); it grows when a score lands
+    outside that range. `total` counts every egg, bad ones included, since the
+    median is taken at offset total/2 like the old OFFSET query.
+
+    Writes patch it while request threads read it, and growing rebuilds the
+    tree in place, so both go through the lock.
+    """
+
+    def __init__(self, scores=(), total=0, lo=-64, hi=64):
+        self._lock = threading.Lock()
+        self.counts = {}
+        for score in scores:
+            self.counts[score] = self.counts.get(score, 0) + 1
+        self.total = total
+        self.size = 0
+        lo = min([lo] + list(self.counts))
+        hi = max([hi - 1] + list(self.counts)) + 1
+        self._rebuild(lo, hi)
+
+    def __len__(self):
+        return self.size
+
+    def _rebuild(self, lo, hi):
+        self.lo = lo
+        self.n = hi - lo
+        self.tree = [0] * (self.n + 1)
+        self.size = 0
+        for score, c in self.counts.items():
+            self._add(score, c)
+
+    def _add(self, score, c):
+        self.size += c
+        i = score - self.lo + 1
+        while i <= self.n:
+            self.tree[i] += c
+            i += i & -i
+
+    def add(self, score, c=1):
+        with self._lock:
+            self._count(score, c)
+
+    def _count(self, score, c):
+        if c == 0:
+            return
+        if score < self.lo or score >= self.lo + self.n:
+            width = max(self.n, 1)
+            lo = min(self.lo, score - width // 2)
+            hi = max(self.lo + self.n, score + width // 2 + 1)
+            self._rebuild(lo, hi)
+        self.counts[score] = self.counts.get(score, 0) + c
+        if not self.counts[score]:
+            del self.counts[score]
+        self._add(score, c)
+
+    def remove(self, score):
+        with self._lock:
+            self._remove(score)
+
+    def _remove(self, score):
+        if self.counts.get(score, 0) > 0:
+            self._count(score, -1)
+
+    def update(self, old, new):
+        """
+        Move an egg between states. `old` and `new` are (score, is_bad) or
+        None for an egg that didn't exist before / doesn't anymore.
+        """
+        with self._lock:
+            if old is None:
+                self.total += 1
+            elif not old[1]:
+                self._remove(old[0])
+            if new is None:
+                self.total -= 1
+            elif not new[1]:
+                self._count(new[0], 1)
+
+    def kth(self, k):
+        """The k-th smallest score, 0 based"""
+        with self._lock:
+            return self._kth(k)
+
+    def _kth(self, k):
+        if k < 0 or k >= self.size:
+            return None
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= k:
+                pos = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return pos + self.lo
+
+    def median(self):
+        """Score at offset total/2; None when bad eggs eat past the middle"""
+        with self._lock:
+            return self._kth(self.total // 2)
+
+    def percentile(self, p):
+        """Nearest-rank percentile of the non-bad scores, p in [0, 100]"""
+        p = max(0.0, min(100.0, float(p)))
+        with self._lock:
+            if not self.size:
+                return None
+            return self._kth(min(self.size - 1, int(p / 100 * self.size)))
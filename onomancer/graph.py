@@ -0,0 +1,106 @@
+"""
+In-memory egg / name graph for the crawl endpoints.
+
+Full names are edges between their first and second egg; crawling is a
+bounded breadth first walk over those edges. Like eggs.py, nothing in here
+talks to the database.
+"""
+import random
+import threading
+from collections import defaultdict
+
+
+def split_name(name):
+    """(first egg, second egg) of a full name, same split as the leaders egg ids"""
+    first, _, second = name.partition(' ')
+    return first, second or None
+
+
+class EggGraph:
+    """
+    Every non-naughty leader, indexed by its first and by its second egg.
+
+    Votes live on the edges so crawl thresholds are a filter at walk time;
+    `set_leader` / `remove_leader` keep it current between reloads. Writers
+    patch it while request threads crawl, so both go through the lock.
+    """
+
+    def __init__(self, leaders=()):
+        self._lock = threading.Lock()
+        self.votes = {}
+        self.by_first = defaultdict(set)
+        self.by_second = defaultdict(set)
+        for r in leaders:
+            self.set_leader(r['name'], r['votes'])
+
+    def __len__(self):
+        return len(self.votes)
+
+    def set_leader(self, name, votes):
+        with self._lock:
+            if name not in self.votes:
+                first, second = split_name(name)
+                self.by_first[first].add(name)
+                if second is not None:
+                    self.by_second[second].add(name)
+            self.votes[name] = votes
+
+    def remove_leader(self, name):
+        with self._lock:
+            if self.votes.pop(name, None) is None:
+                return
+            first, second = split_name(name)
+            self._unlink(self.by_first, first, name)
+            if second is not None:
+                self._unlink(self.by_second, second, name)
+
+    @staticmethod
+    def _unlink(index, egg, name):
+        names = index.get(egg)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[egg]
+
+    def _sample(self, firsts, seconds, threshold, k):
+        """Up to k random names leading with one of `firsts` or trailing with one of `seconds`"""
+        found = set()
+        with self._lock:
+            for egg in firsts:
+                found.update(self.by_first.get(egg, ()))
+            for egg in seconds:
+                found.update(self.by_second.get(egg, ()))
+            found = [n for n in found if self.votes[n] >= threshold]
+        if len(found) <= k:
+            return found
+        return random.sample(found, k)
+
+    def crawl_names(self, likeness, threshold=0, fanout=2, limit=100):
+        first, second = likeness.split(' ')
+        fanout = max(1, min(fanout, 10))
+        gensize = max(1, int(limit / fanout))
+        firsts = {first}
+        seconds = {second}
+        names = {likeness}
+        for _ in range(fanout):
+            names.update(self._sample(firsts, seconds, threshold, gensize))
+            firsts = {n.split(' ')[0] for n in names}
+            seconds = {n.split(' ')[-1] for n in names}
+        return random.sample(list(names), min(limit, len(names)))
+
+    def crawl_eggs(self, likenesses, threshold=0, fanout=3, limit=10, egg_ok=None):
+        """
+        `egg_ok(egg)` decides whether an egg found along the way is worth
+        crawling out from; the eggs asked for are always used.
+        """
+        fanout = max(1, min(fanout, 10))
+        gensize = max(int(limit / fanout), 10)
+        eggs = set(likenesses)
+        names = set()
+        for _ in range(fanout):
+            if not eggs:
+                break
+            names.update(self._sample(eggs, eggs, threshold, gensize))
+            found = {e for n in names for e in n.split(' ') if e not in eggs}
+            eggs |= {e for e in found if egg_ok is None or egg_ok(e)}
+        return random.sample(list(names), min(limit, len(names)))
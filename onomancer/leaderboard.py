@@ -0,0 +1,140 @@
+"""
+In-memory top of the leaderboard and the weekly board.
+
+database.py loads the best rows once and feeds every leader row it writes
+back in here; nothing in here talks to the database.
+"""
+import random
+import threading
+from itertools import groupby
+
+TOP_K = 200
+
+
+class TopK:
+    """
+    Every eligible leader with at least `floor` votes, for some floor chosen
+    so that there are at least `k` of them (or every eligible leader there
+    is, when `complete`).
+
+    Holding whole vote buckets means the random tie-break only ever needs
+    the bucket at the cut. Writes patch it while request threads read it, so
+    both go through the lock.
+    """
+
+    def __init__(self, rows, k=TOP_K, complete=False):
+        self._lock = threading.Lock()
+        self.k = k
+        self.rows = {r['name']: dict(r) for r in rows}
+        self.complete = complete
+        self.floor = min((r['votes'] for r in self.rows.values()), default=None)
+        self._order = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def short(self):
+        """Too few rows held to answer a top-k, time to reload"""
+        return not self.complete and len(self.rows) < self.k
+
+    def update(self, row, eligible):
+        """A leader row was written; `eligible` if it belongs on the board at all"""
+        name = row['name']
+        with self._lock:
+            if eligible and (self.complete or row['votes'] >= self.floor):
+                self.rows[name] = dict(row)
+                self._order = None
+                if len(self.rows) > 2 * self.k:
+                    self._trim()
+            elif self.rows.pop(name, None) is not None:
+                self._order = None
+
+    def _trim(self):
+        """Raise the floor a bucket at a time while k rows stay above it"""
+        buckets = self._buckets()
+        kept = 0
+        for i, (votes, bucket) in enumerate(buckets):
+            kept += len(bucket)
+            if kept >= self.k:
+                break
+        for _, bucket in buckets[i + 1:]:
+            for r in bucket:
+                del self.rows[r['name']]
+        self.floor = votes
+        self.complete = False
+        self._order = None
+
+    def _buckets(self):
+        if self._order is None:
+            self._order = sorted(self.rows.values(), key=lambda r: -r['votes'])
+        return [(votes, list(bucket)) for votes, bucket in groupby(self._order, key=lambda r: r['votes'])]
+
+    def top(self, n):
+        """Best `n` rows by votes, ties at the cut broken at random"""
+        res = []
+        with self._lock:
+            for _, bucket in self._buckets():
+                if len(res) + len(bucket) > n:
+                    res.extend(random.sample(bucket, n - len(res)))
+                    break
+                res.extend(bucket)
+            return [dict(r) for r in res]
+
+
+class RandomSet:
+    """A set with O(1) add, discard and uniform random choice, safe across threads"""
+
+    def __init__(self, items=()):
+        self._lock = threading.Lock()
+        self.items = list(dict.fromkeys(items))
+        self.pos = {item: i for i, item in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        with self._lock:
+            if item not in self.pos:
+                self.pos[item] = len(self.items)
+                self.items.append(item)
+
+    def discard(self, item):
+        with self._lock:
+            i = self.pos.pop(item, None)
+            if i is None:
+                return
+            last = self.items.pop()
+            if i < len(self.items):
+                self.items[i] = last
+                self.pos[last] = i
+
+    def choice(self):
+        with self._lock:
+            return random.choice(self.items) if self.items else None
+
+
+class WeeklyBoard:
+    """
+    This week's rolling totals: the top of the names at or above 0 votes, and
+    every name above 0 for random draws.
+    """
+
+    def __init__(self, top, drawable):
+        self.top = top
+        self.drawable = RandomSet(drawable)
+
+    @property
+    def short(self):
+        return self.top.short
+
+    def update(self, row, eligible):
+        """A weekly row was written; `eligible` if its leader is allowed on boards"""
+        self.top.update(row, eligible and row['votes'] >= 0)
+        if eligible and row['votes'] > 0:
+            self.drawable.add(row['name'])
+        else:
+            self.drawable.discard(row['name'])
+
+    def draw(self):
+        return self.drawable.choice()
@@ -0,0 +1,39 @@
+"""
+Checks and cleanup every submitted egg or name goes through, shared by the
+app and the bulk importer.
+"""
+import re
+
+from profanity import profanity
+
+profanity.load_words()
+# same answer as profanity.contains_profanity, in one pass instead of a regex per word
+_profane = re.compile('|'.join(re.escape(w) for w in profanity.get_words() if w), re.IGNORECASE)
+
+NBSP = u'\u00A0'
+
+
+def process_name(name):
+    """The name as it should be stored; ValueError if it can't be"""
+    if not name:
+        raise ValueError()
+    if len(name) > 25:
+        raise ValueError()
+    profane = _profane.search(name)
+    if profane:
+        raise ValueError()
+    name = name.strip()
+    if name.lower() == name:
+        # no capital letters, make some assumptions
+        return name.title()
+    return name
+
+
+def egg_name(name):
+    """Spaces inside a single egg are nonbreaking"""
+    return name.replace(' ', NBSP)
+
+
+def split_full_name(name):
+    """Eggs of a full name, the first space splits them"""
+    return [egg_name(e) for e in name.split(' ', 1)]
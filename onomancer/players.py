@@ -0,0 +1,190 @@
+"""
+FK player stats for names. Everything but the vibe is deterministic in the
+name, so that part (the core) is generated once and kept in a per-process
+lru and, for names on the leaderboard, the player_stats table shared by every
+worker. Cores are read-only; the vibe is laid over a copy per request.
+
+    python -m onomancer.players warm
+"""
+import datetime
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import MappingProxyType
+
+from blaseball_mike.models import Player
+from pylru import lrucache
+
+from onomancer import database, ratings
+
+# bump when generation changes, so the cached stats get made again
+STATS_VERSION = 1
+# names per lookup when warming the cache
+WARM_CHUNK = 500
+# processes generating big batches of players, 0 to generate everything in
+# the calling thread. Batches smaller than PLAYER_INLINE always are, and a
+# worker gets at most PLAYER_CHUNK names at a time
+PLAYER_POOL_SIZE = int(os.environ.get('ONOMANCER_PLAYER_POOL_SIZE', 2))
+PLAYER_INLINE = int(os.environ.get('ONOMANCER_PLAYER_INLINE', 32))
+PLAYER_CHUNK = 64
+
+# pylru isn't thread safe, and even a hit reorders it
+_cores = lrucache(4096)
+_cores_lock = threading.Lock()
+
+
+def generate(name):
+    """Stats of `name`, minus the vibe"""
+    return _generate_chunk([name])[0]
+
+
+def _generate_chunk(names):
+    # ratings and stars for the whole chunk in one go, see onomancer.ratings
+    players = []
+    for name in names:
+        player = Player.make_random(name=name, seed=name)
+        player = player.simulated_copy(buffs={'overall_rating': (player.total_fingers - 10) * .01})
+        js = player.json()
+        js['soulscream'] = player.soulscream
+        players.append(js)
+    return ratings.add_ratings(players)
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def _generator_pool():
+    """This process's worker pool, started on first use; None when disabled"""
+    global _generator, _generator_pid
+    if PLAYER_POOL_SIZE <= 0:
+        return None
+    with _generator_lock:
+        if _generator is None or _generator_pid != os.getpid():
+            # spawned, not forked: the app's threads and sqlite connections stay behind
+            _generator = ProcessPoolExecutor(PLAYER_POOL_SIZE, mp_context=multiprocessing.get_context('spawn'))
+            _generator_pid = os.getpid()
+        return _generator
+
+
+def _drop_generator_pool(pool):
+    global _generator
+    with _generator_lock:
+        if _generator is pool:
+            _generator = None
+    pool.shutdown(wait=False)
+
+
+def generate_many(names):
+    """generate() of each of `names`, in order. Big batches are split over the worker pool"""
+    names = list(names)
+    pool = _generator_pool() if len(names) >= PLAYER_INLINE else None
+    if pool is None:
+        return _generate_chunk(names)
+    # enough chunks to keep every worker busy, but no bigger than PLAYER_CHUNK
+    size = max(1, min(PLAYER_CHUNK, math.ceil(len(names) / PLAYER_POOL_SIZE)))
+    chunks = [names[i:i + size] for i in range(0, len(names), size)]
+    try:
+        return [js for chunk in pool.map(_generate_chunk, chunks) for js in chunk]
+    except BrokenProcessPool:
+        # a worker died; start a new pool next time, this batch is done here
+        _drop_generator_pool(pool)
+        return _generate_chunk(names)
+
+
+def get_stats(names, save=True):
+    """
+    name -> read-only core stats for each of `names`, generating any not
+    cached yet. Those are saved too, unless `save` is off for callers that
+    are about to write anyway and shouldn't pay for another transaction
+    """
+    stats = {}
+    todo = []
+    with _cores_lock:
+        for name in dict.fromkeys(names):
+            core = _cores.get(name)
+            if core is not None:
+                stats[name] = core
+            else:
+                todo.append(name)
+    if not todo:
+        return stats
+    found = database.get_player_stats(todo, STATS_VERSION)
+    missing = [name for name in todo if name not in found]
+    missing = dict(zip(missing, generate_many(missing)))
+    if missing and save:
+        database.save_player_stats(missing, STATS_VERSION)
+    found.update(missing)
+    with _cores_lock:
+        for name, js in found.items():
+            stats[name] = _cores[name] = MappingProxyType(js)
+    return stats
+
+
+def current_day():
+    now = datetime.datetime.utcnow()
+    monday = now - datetime.timedelta(days=now.weekday())
+    return (now - monday.replace(hour=17)).total_seconds() / 3600
+
+
+def vibe_curve(stats, days):
+    """Vibe of core `stats` on each of `days`, None where there is none"""
+    return [None if math.isnan(v) else v for v in ratings.vibes(ratings.matrix([stats]), days)[0].tolist()]
+
+
+def vibe(stats, day):
+    return vibe_curve(stats, [day])[0]
+
+
+def with_vibe(stats, id_=None, current_vibe=None):
+    """A player of its own from core `stats`, vibing as of now unless told otherwise"""
+    js = dict(stats)
+    if id_:
+        js['id'] = id_
+    js['current_vibe'] = vibe(stats, current_day()) if current_vibe is None else current_vibe
+    return js
+
+
+def player_json(name, id_=None, current_vibe=None):
+    return with_vibe(get_stats([name])[name], id_, current_vibe)
+
+
+def players_json(names):
+    """player_json of each name, in order, from one cache lookup"""
+    stats = get_stats(names)
+    cores = [stats[name] for name in names]
+    # everybody's vibe in one go
+    vibes = ratings.vibes(ratings.matrix(cores), [current_day()])[:, 0].tolist()
+    return [with_vibe(core, current_vibe=None if math.isnan(v) else v) for core, v in zip(cores, vibes)]
+
+
+def warm(chunk=WARM_CHUNK):
+    """Cache the stats of every good name on the leaderboard. Returns how many were generated"""
+    generated = 0
+    names = []
+    for row in database.iter_rows('leaders'):
+        if row['naughty'] == 0:
+            names.append(row['name'])
+        if len(names) >= chunk:
+            generated += _warm(names)
+            names = []
+    return generated + _warm(names)
+
+
+def _warm(names):
+    cached = database.get_player_stats(names, STATS_VERSION)
+    missing = [name for name in names if name not in cached]
+    missing = dict(zip(missing, generate_many(missing)))
+    if missing:
+        database.save_player_stats(missing, STATS_VERSION)
+    return len(missing)
+
+
+if __name__ == '__main__':
+    if 'warm' in sys.argv:
+        print(f'generated {warm()} players')
@@ -0,0 +1,124 @@
+"""
+Ratings, stars and vibes of FK players as array maths over their attributes,
+so a batch of players (or a whole vibe curve) is one call. Same formulas as
+blaseball_mike's Player; `python -m onomancer.ratings check` compares the two.
+"""
+import math
+import sys
+
+import numpy as np
+
+# attribute vector layout, keys of Player.json()
+ATTRS = [
+    'tragicness', 'patheticism', 'thwackability', 'divinity', 'moxie', 'musclitude', 'martyrdom',
+    'unthwackability', 'ruthlessness', 'overpowerment', 'shakespearianism', 'coldness',
+    'laserlikeness', 'continuation', 'baseThirst', 'indulgence', 'groundFriction',
+    'omniscience', 'tenaciousness', 'watchfulness', 'anticapitalism', 'chasiness',
+    'pressurization', 'cinnamon', 'buoyancy',
+]
+_COL = {attr: i for i, attr in enumerate(ATTRS)}
+CATEGORIES = ('batting', 'pitching', 'baserunning', 'defense')
+
+
+def matrix(players):
+    """players x ATTRS array from player json dicts"""
+    return np.array([[p.get(attr) or 0.0 for attr in ATTRS] for p in players], dtype=float).reshape(-1, len(ATTRS))
+
+
+def _col(m, attr):
+    return m[:, _COL[attr]]
+
+
+def ratings(m):
+    """category -> rating of each player (row) of `m`"""
+    def a(attr):
+        return _col(m, attr)
+
+    return {
+        'batting': (
+            (1 - a('tragicness')) ** 0.01 * (1 - a('patheticism')) ** 0.05 *
+            (a('thwackability') * a('divinity')) ** 0.35 *
+            (a('moxie') * a('musclitude')) ** 0.075 * a('martyrdom') ** 0.02
+        ),
+        'pitching': (
+            a('unthwackability') ** 0.5 * a('ruthlessness') ** 0.4 *
+            a('overpowerment') ** 0.15 * a('shakespearianism') ** 0.1 * a('coldness') ** 0.025
+        ),
+        'baserunning': (
+            a('laserlikeness') ** 0.5 *
+            (a('continuation') * a('baseThirst') * a('indulgence') * a('groundFriction')) ** 0.1
+        ),
+        'defense': (
+            (a('omniscience') * a('tenaciousness')) ** 0.2 *
+            (a('watchfulness') * a('anticapitalism') * a('chasiness')) ** 0.1
+        ),
+    }
+
+
+def stars(rating):
+    """Half stars, as Player.*_stars (round half to even, like python's round)"""
+    return 0.5 * np.round(rating * 10)
+
+
+def vibes(m, days):
+    """players x days array of vibes; nan where Player.get_vibe would give None"""
+    days = np.asarray(days, dtype=float)
+    p = _col(m, 'pressurization')[:, None]
+    c = _col(m, 'cinnamon')[:, None]
+    b = _col(m, 'buoyancy')[:, None]
+    res = 0.5 * ((p + c) * np.sin(math.pi * (2 / (6 + np.round(10 * b)) * (days - 1) + 0.5)) - p + c)
+    # get_vibe gives up on any of them being missing or zero
+    res[((p == 0) | (c == 0) | (b == 0))[:, 0]] = np.nan
+    return res
+
+
+def add_ratings(players):
+    """Set the rating and star keys of each player json dict, in place"""
+    rated = ratings(matrix(players))
+    for cat in CATEGORIES:
+        for player, rating, star in zip(players, rated[cat].tolist(), stars(rated[cat]).tolist()):
+            player[f'{cat}_rating'] = rating
+            player[f'{cat}_stars'] = star
+    return players
+
+
+def check(count=500, days=range(0, 120)):
+    """
+    Mismatches between this and blaseball_mike over `count` generated
+    players, as (name, what, ours, theirs); empty if they agree
+    """
+    from blaseball_mike.models import Player
+
+    names = [f'Golden{i} Check{i * 7919 % 1000}' for i in range(count)]
+    players = []
+    for name in names:
+        player = Player.make_random(name=name, seed=name)
+        players.append(player.simulated_copy(buffs={'overall_rating': (player.total_fingers - 10) * .01}))
+    m = matrix([p.json() for p in players])
+    rated = ratings(m)
+    curves = vibes(m, list(days))
+    bad = []
+    for i, (name, player) in enumerate(zip(names, players)):
+        for cat in CATEGORIES:
+            theirs = getattr(player, f'{cat}_rating')
+            if not math.isclose(rated[cat][i], theirs, rel_tol=1e-12, abs_tol=1e-15):
+                bad.append((name, f'{cat}_rating', rated[cat][i], theirs))
+            theirs = getattr(player, f'{cat}_stars')
+            if stars(rated[cat][i]) != theirs:
+                bad.append((name, f'{cat}_stars', stars(rated[cat][i]), theirs))
+        for j, day in enumerate(days):
+            theirs = player.get_vibe(day)
+            ours = None if np.isnan(curves[i, j]) else curves[i, j]
+            if (ours is None) != (theirs is None) or (ours is not None and not math.isclose(ours, theirs, rel_tol=1e-9, abs_tol=1e-12)):
+                bad.append((name, f'vibe day {day}', ours, theirs))
+    return bad
+
+
+if __name__ == '__main__':
+    if 'check' in sys.argv:
+        bad = check()
+        for name, what, ours, theirs in bad[:20]:
+            print(f'{name} {what}: {ours} != {theirs}')
+        print(f'{len(bad)} mismatches')
+        if bad:
+            sys.exit(1)
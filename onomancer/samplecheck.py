@@ -0,0 +1,57 @@
+"""
+Chi-square check that database.sample_rows draws uniformly, over a temp
+table with holes in its ids and a filter that drops some of the rest.
+
+    python -m onomancer.samplecheck
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+
+from onomancer import database
+
+
+def check_sampler(rows=1000, draws=100, k=5, alpha_z=3.09):
+    """
+    Samples of `k` over roughly `rows` ids. Prints the statistic and returns
+    False if uniformity is rejected at roughly p=0.001 (alpha_z is the
+    matching normal quantile).
+    """
+    conn = database.connect()
+    with conn:
+        conn.execute('CREATE TEMP TABLE sample_check (id INTEGER PRIMARY KEY, keep INTEGER)')
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT INTO sample_check (id, keep) VALUES (?, ?)',
+                [(i, int(random.random() < .7)) for i in range(1, rows + 1) if random.random() < .7],
+            )
+            ids = [r['id'] for r in conn.execute('SELECT id FROM sample_check WHERE keep = 1')]
+            counts = dict.fromkeys(ids, 0)
+            trials = draws * len(ids) // k
+            for _ in range(trials):
+                sample = database.sample_rows(conn, 'sample_check', 'keep = ?', (1,), k, 'id')
+                if len({r['id'] for r in sample}) != k:
+                    print(f'wanted {k} distinct rows, got {[r["id"] for r in sample]}')
+                    return False
+                for r in sample:
+                    counts[r['id']] += 1
+    finally:
+        with conn:
+            conn.execute('DROP TABLE temp.sample_check')
+    expected = trials * k / len(ids)
+    stat = sum((c - expected) ** 2 / expected for c in counts.values())
+    df = len(ids) - 1
+    # Wilson-Hilferty approximation of the chi-square critical value
+    critical = df * (1 - 2 / (9 * df) + alpha_z * math.sqrt(2 / (9 * df))) ** 3
+    print(f'{trials} samples of {k} over {len(ids)} rows: chi2={stat:.1f} critical={critical:.1f} df={df}')
+    return stat <= critical
+
+
+if __name__ == '__main__':
+    # only a temp table is used, so it runs without the real db (as in a build)
+    database.DB_NAME = os.path.join(tempfile.mkdtemp(), 'samplecheck.db')
+    if not check_sampler():
+        sys.exit(1)
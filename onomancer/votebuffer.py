@@ -0,0 +1,122 @@
+"""
+Write-behind buffer for votes.
+
+Votes are coalesced per name in memory and handed to a flush callback in one
+batch, either every `interval` seconds or once `batch_size` names are pending.
+"""
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class VoteDelta:
+    """Everything that's happened to one name since the last flush"""
+
+    __slots__ = ('up', 'down', 'egg_up', 'egg_down', 'first')
+
+    def __init__(self, up=0, down=0, egg_up=0, egg_down=0):
+        self.up = up
+        self.down = down
+        self.egg_up = egg_up
+        self.egg_down = egg_down
+        # a brand new name starts on 1 vote whatever its first thumbs were
+        self.first = None
+
+    @classmethod
+    def of(cls, thumbs, hit_eggs=True):
+        delta = cls()
+        delta.add(thumbs, hit_eggs)
+        return delta
+
+    def add(self, thumbs, hit_eggs=True):
+        if self.first is None:
+            self.first = thumbs
+        if thumbs > 0:
+            self.up += thumbs
+            if hit_eggs:
+                self.egg_up += thumbs
+        elif thumbs < 0:
+            self.down += thumbs
+            if hit_eggs:
+                self.egg_down += thumbs
+
+    def merge(self, other):
+        if self.first is None:
+            self.first = other.first
+        self.up += other.up
+        self.down += other.down
+        self.egg_up += other.egg_up
+        self.egg_down += other.egg_down
+
+    @property
+    def votes(self):
+        return self.up + self.down
+
+
+class VoteBuffer:
+
+    def __init__(self, flush, interval=1.0, batch_size=200):
+        self._flush = flush
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def add(self, name, thumbs, hit_eggs=True):
+        with self._lock:
+            self._ensure_thread()
+            delta = self._pending.get(name)
+            if delta is None:
+                delta = self._pending[name] = VoteDelta()
+            delta.add(thumbs, hit_eggs)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def pending(self, name):
+        """Votes for `name` not yet written, so reads can show them"""
+        delta = self._pending.get(name)
+        return delta.votes if delta else 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # inherited through a fork, the parent flushes its own votes
+                self._pending = {}
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            self._flush(batch)
+        except Exception:
+            logger.exception('vote flush failed, requeueing %d names', len(batch))
+            with self._lock:
+                for name, delta in batch.items():
+                    if name in self._pending:
+                        delta.merge(self._pending[name])
+                    self._pending[name] = delta
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            self._pending = {}
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='vote-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()